@@ -0,0 +1,409 @@
+"""
+Batched evaluation of many positions at once with NumPy.
+
+evaluate() in engine.py scores one GobbletEngine per call; every leaf pays
+Python's per-call and per-loop overhead. Here a batch of positions is a few
+arrays (planes), and the size, line, prime-spot and mobility factors of all
+of them come out of whole-array operations:
+
+    owner:   (n, 16) int8, player owning the top of each square (0 if empty)
+    size:    (n, 16) int8, size of that top piece (0 if empty)
+    to_move: (n,)    int8, side to move (1 or 2)
+    supply:  (n, 3, 5) int8, unused pieces per [player][size] (row 0 and
+             column 0 unused, as GobbletEngine.supply_counts), or None
+
+Planes come from engines (encode_engines) or from the compact wire format
+(encode_wire, e.g. positions logged by self-play). Scores are from the
+side to move's point of view, like evaluate's.
+
+    owner, size, to_move, supply = encode_wire(wires)
+    scores = evaluate_batch(owner, size, to_move, supply)
+    moves, scores = evaluate_children(engine)      # one frontier node
+
+The 'engine' preset reproduces engine.evaluate exactly. The 'owen' preset
+uses engineowen.evaluate's weights, line scoring and prime spots, but with
+the real top pieces (engineowen.evaluate reads board[r][c][0], the bottom
+of a stack), so the two agree on positions without stacked pieces.
+Without a supply array the mobility factor is left out.
+
+Where it pays: engine.evaluate is incremental (lookups on the engine's line
+state), so for engine.py engines that already exist, encoding them costs
+more than evaluating them one by one. The batch wins where no engine per
+position is needed: at a frontier node, evaluate_children derives the
+children's planes from the parent's without making any move (about 2.5x a
+make / evaluate / unmake loop here), on wire-format data, and against
+engineowen.evaluate (about 20x, encoding included).
+
+    python batch_eval.py                  # check against both evaluates, time them
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+import engine
+import engineowen
+
+NUM_SQUARES = engine.NUM_SQUARES
+WIN_SCORE = engine.WIN_SCORE
+
+# (10, 4) square indices of the winning lines, in engine.LINES order
+LINE_SQUARES = np.array(engine.LINES, dtype=np.intp)
+# Corners and the four centre squares (engineowen's prime_spots)
+PRIME_SQUARES = np.zeros(NUM_SQUARES, dtype=bool)
+PRIME_SQUARES[[0, 3, 12, 15, 5, 6, 9, 10]] = True
+
+PRESETS = {
+    # engine.evaluate: 5 * size + 3 * mobility + 3 * (2 * open-line difference)
+    'engine': {'size': 5, 'mobility': 3, 'line': 3, 'prime': 0, 'lines': 'open'},
+    # engineowen.evaluate: 5 * size + mobility + 5 * line + 2 * prime spots
+    'owen': {'size': 5, 'mobility': 1, 'line': 5, 'prime': 2, 'lines': 'owen'},
+}
+
+
+####################################################
+#               ENCODING POSITIONS
+####################################################
+
+def encode_engines(engines):
+    """
+    Planes (owner, size, to_move, supply) for a list of engines. Uses the
+    incremental top_owner / top_size / supply_counts of engine.py's
+    GobbletEngine, or reads the board and supply lists of any other engine
+    (engineowen's).
+    """
+    n = len(engines)
+    owner = np.zeros((n, NUM_SQUARES), dtype=np.int8)
+    size = np.zeros((n, NUM_SQUARES), dtype=np.int8)
+    to_move = np.zeros(n, dtype=np.int8)
+    supply = np.zeros((n, 3, 5), dtype=np.int8)
+    for i, position in enumerate(engines):
+        to_move[i] = position.current_player
+        if hasattr(position, 'top_owner'):
+            owner[i] = position.top_owner
+            size[i] = position.top_size
+            supply[i, 1] = position.supply_counts[1]
+            supply[i, 2] = position.supply_counts[2]
+            continue
+        for sq in range(NUM_SQUARES):
+            stack = position.board[sq // 4][sq % 4]
+            if stack:
+                owner[i, sq] = stack[-1]['player']
+                size[i, sq] = stack[-1]['size']
+        for player, pieces in ((1, position.supply1), (2, position.supply2)):
+            for piece in pieces:
+                if not piece['used']:
+                    supply[i, player, piece['size']] += 1
+    return owner, size, to_move, supply
+
+def encode_wire(wires):
+    """
+    Planes (owner, size, to_move, supply) for an (n, WIRE_LENGTH) array of
+    positions in engine.py's compact wire format: the top of a square is
+    its largest piece, whose base-3 digit in the stack code is the owner.
+    """
+    wires = np.asarray(wires, dtype=np.int64).reshape(-1, engine.WIRE_LENGTH)
+    codes = wires[:, :NUM_SQUARES]
+    # digits[:, sq, s - 1]: owner of the size-s piece on sq (0 if none)
+    digits = (codes[:, :, None] // 3 ** np.arange(4)) % 3
+    present = digits > 0
+    # Largest size present: 4 minus the index of the first hit from the top
+    top_index = 3 - np.argmax(present[:, :, ::-1], axis=2)
+    has_piece = present.any(axis=2)
+    size = np.where(has_piece, top_index + 1, 0).astype(np.int8)
+    owner = np.where(has_piece,
+                     np.take_along_axis(digits, top_index[:, :, None], axis=2)[:, :, 0],
+                     0).astype(np.int8)
+    supply = np.zeros((len(wires), 3, 5), dtype=np.int8)
+    supply[:, 1, 1:] = wires[:, 16:20]
+    supply[:, 2, 1:] = wires[:, 20:24]
+    return owner, size, wires[:, 24].astype(np.int8), supply
+
+
+####################################################
+#               FACTORS
+####################################################
+
+def winners(owner, line_owners=None):
+    """
+    (n,) winner of each position (0 for none), the first full line in
+    engine.LINES order deciding as in GobbletEngine.winner. line_owners is
+    owner[:, LINE_SQUARES] if the caller already has it.
+    """
+    if line_owners is None:
+        line_owners = owner[:, LINE_SQUARES]
+    full1 = (line_owners == 1).all(axis=2)
+    full2 = (line_owners == 2).all(axis=2)
+    full = full1 | full2
+    first = np.argmax(full, axis=1)
+    first_is_1 = full1[np.arange(len(owner)), first]
+    return np.where(full.any(axis=1), np.where(first_is_1, 1, 2), 0)
+
+def size_factor(owner, size, me, them):
+    """Top-size sum of the side to move minus the opponent's."""
+    sign = (owner == me).astype(np.int8) - (owner == them)
+    return (sign * size).sum(axis=1, dtype=np.int64)
+
+def prime_factor(owner, me, them):
+    """Prime squares topped by the side to move minus the opponent's."""
+    prime = owner[:, PRIME_SQUARES]
+    return (prime == me).sum(axis=1) - (prime == them).sum(axis=1)
+
+def open_line_factor(line_owners, me, them):
+    """
+    engine.evaluate's line factor: twice the difference of open lines (at
+    least one own top and none of the opponent's).
+    """
+    mine = (line_owners == me).sum(axis=2)
+    theirs = (line_owners == them).sum(axis=2)
+    open_mine = ((mine > 0) & (theirs == 0)).sum(axis=1)
+    open_theirs = ((theirs > 0) & (mine == 0)).sum(axis=1)
+    return (open_mine - open_theirs) * 2
+
+def owen_line_factor(line_owners, me, them):
+    """
+    engineowen.evaluate's line factor, term for term: 2 ** count // 2 for
+    each line holding our tops, minus, for the opponent, 2 ** (running
+    count) at every square from their first top on, halved if we also
+    have a top on the line.
+    """
+    mine = (line_owners == me).sum(axis=2, dtype=np.int64)
+    ours = np.where(mine > 0, 1 << np.maximum(mine - 1, 0), 0).sum(axis=1)
+    running = np.cumsum(line_owners == them, axis=2)
+    shift = np.maximum(running - (mine > 0)[:, :, None], 0)
+    theirs = np.where(running > 0, 1 << shift, 0).sum(axis=(1, 2))
+    return ours - theirs
+
+def squares_below(size):
+    """
+    (n, 5) table: [:, s] is the number of squares whose top is smaller
+    than s (empty squares count as size 0), i.e. where a size-s piece fits.
+    """
+    n = len(size)
+    hist = np.bincount((np.arange(n)[:, None] * 5 + size).ravel(), minlength=5 * n)
+    below = np.zeros((n, 5), dtype=np.int64)
+    np.cumsum(hist.reshape(n, 5)[:, :4], axis=1, out=below[:, 1:])
+    return below
+
+def mobility(owner, size, supply, player, below=None):
+    """
+    Moves of 'player' ((n,) array), a supply move counting once per unused
+    piece, as GobbletEngine.count_moves(player, per_piece=True): a piece of
+    size s goes to every square whose top is smaller.
+    """
+    if below is None:
+        below = squares_below(size)
+    board = np.take_along_axis(below, size.astype(np.intp), axis=1)
+    board = (board * (owner == player[:, None])).sum(axis=1)
+    pieces = supply[np.arange(len(owner)), player, 1:]
+    return board + (pieces * below[:, 1:]).sum(axis=1)
+
+
+####################################################
+#               EVALUATION
+####################################################
+
+def evaluate_batch(owner, size, to_move, supply=None, preset='engine'):
+    """
+    (n,) int64 scores of the encoded positions for their side to move:
+    +/-WIN_SCORE for a won position, otherwise the preset's weighted sum of
+    the size, mobility (needs 'supply'), line and prime-spot factors.
+    """
+    weights = PRESETS[preset]
+    owner = np.asarray(owner)
+    size = np.asarray(size)
+    me = np.asarray(to_move, dtype=np.intp)
+    them = 3 - me
+    me_col, them_col = me[:, None], them[:, None]
+
+    score = weights['size'] * size_factor(owner, size, me_col, them_col)
+    line_owners = owner[:, LINE_SQUARES]
+    if weights['lines'] == 'open':
+        lines = open_line_factor(line_owners, me_col[:, :, None], them_col[:, :, None])
+    else:
+        lines = owen_line_factor(line_owners, me_col[:, :, None], them_col[:, :, None])
+    score += weights['line'] * lines
+    if weights['prime']:
+        score += weights['prime'] * prime_factor(owner, me_col, them_col)
+    if supply is not None and weights['mobility']:
+        supply = np.asarray(supply)
+        below = squares_below(size)
+        score += weights['mobility'] * (mobility(owner, size, supply, me, below) -
+                                        mobility(owner, size, supply, them, below))
+
+    winner = winners(owner, line_owners)
+    score = np.where(winner == me, WIN_SCORE, score)
+    score = np.where(winner == them, -WIN_SCORE, score)
+    return score.astype(np.int64)
+
+def evaluate_engines(engines, preset='engine'):
+    """evaluate_batch over a list of engines."""
+    return evaluate_batch(*encode_engines(engines), preset=preset)
+
+def evaluate_wire(wires, preset='engine'):
+    """evaluate_batch over positions in the compact wire format."""
+    return evaluate_batch(*encode_wire(wires), preset=preset)
+
+def child_planes(position, moves):
+    """
+    Planes of the positions 'moves' lead to, derived from the parent's
+    planes: a move only changes its target square (now the moved piece),
+    the square it left (now the piece underneath, if any) and, for a supply
+    move, one supply count. Nothing is made, unmade or copied per child
+    beyond reading the move.
+    """
+    owner, size, _, supply = encode_engines([position])
+    board = position.board
+    player = position.current_player
+    n = len(moves)
+    from_sq = np.empty(n, dtype=np.intp)
+    to_sq = np.empty(n, dtype=np.intp)
+    piece_size = np.empty(n, dtype=np.int8)
+    under_owner = np.zeros(n, dtype=np.int8)
+    under_size = np.zeros(n, dtype=np.int8)
+    from_supply = np.zeros(n, dtype=bool)
+    for i, move in enumerate(moves):
+        r, c = move['to']
+        to_sq[i] = r * 4 + c
+        piece_size[i] = move['piece']['size']
+        if move['type'] == 'supply':
+            # No square is left: let the 'from' write hit the target square,
+            # which the 'to' write then overwrites
+            from_sq[i] = to_sq[i]
+            from_supply[i] = True
+            continue
+        r, c = move['from']
+        from_sq[i] = r * 4 + c
+        stack = board[r][c]
+        if len(stack) > 1:
+            under_owner[i] = stack[-2]['player']
+            under_size[i] = stack[-2]['size']
+
+    rows = np.arange(n)
+    owner = np.repeat(owner, n, axis=0)
+    size = np.repeat(size, n, axis=0)
+    supply = np.repeat(supply, n, axis=0)
+    owner[rows, from_sq] = under_owner
+    size[rows, from_sq] = under_size
+    owner[rows, to_sq] = player
+    size[rows, to_sq] = piece_size
+    supply[rows[from_supply], player, piece_size[from_supply]] -= 1
+    to_move = np.full(n, 3 - player, dtype=np.int8)
+    return owner, size, to_move, supply
+
+def evaluate_children(position, moves=None, preset='engine'):
+    """
+    Scores every child of a frontier node in one batch. Returns (moves,
+    scores) with scores from the point of view of the side to move in
+    'position' (the negated child evaluations, as negamax uses them).
+    Works on any engine with board, supplies and current_player (engine.py's
+    and engineowen's).
+    """
+    if moves is None:
+        moves = position.generate_moves()
+    if not moves:
+        return moves, np.zeros(0, dtype=np.int64)
+    return moves, -evaluate_batch(*child_planes(position, moves), preset=preset)
+
+
+####################################################
+#               SELF-CHECK
+####################################################
+
+def random_positions(count, seed, max_plies=20):
+    """engine.py positions reached by random play from the start."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = engine.create_engine_from_array([0] * 16 + [3] * 8 + [1])
+        for _ in range(rng.randrange(max_plies + 1)):
+            moves = position.generate_moves()
+            if not moves or position.winner() is not None:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+def position_to_wire(position):
+    """A GobbletEngine in the compact wire format (as index.html encodes it)."""
+    wire = []
+    for row in position.board:
+        for stack in row:
+            wire.append(sum(p['player'] * 3 ** (p['size'] - 1) for p in stack))
+    wire += position.supply_counts[1][1:] + position.supply_counts[2][1:]
+    return wire + [position.current_player]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check batch_eval against the engines' evaluate.")
+    parser.add_argument('--positions', type=int, default=5000,
+                        help="random positions to score (default 5000)")
+    parser.add_argument('--frontier', type=int, default=300,
+                        help="of those, how many to score as frontier nodes (default 300)")
+    parser.add_argument('--owen', type=int, default=2000,
+                        help="of those, how many to try against engineowen.evaluate (default 2000)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    positions = random_positions(args.positions, args.seed)
+    start = time.time()
+    expected = [engine.evaluate(position) for position in positions]
+    loop_time = time.time() - start
+
+    # Timed end to end: encoding the engines is part of the cost
+    start = time.time()
+    scores = evaluate_engines(positions)
+    batch_time = time.time() - start
+
+    mismatches = int((scores != np.array(expected)).sum())
+    wire_scores = evaluate_wire([position_to_wire(p) for p in positions])
+    mismatches += int((wire_scores != scores).sum())
+    print(f"{len(positions)} positions, {mismatches} mismatches")
+    print(f"engine.evaluate:  {loop_time:.3f}s  ({len(positions) / loop_time:.0f}/s)")
+    print(f"evaluate_engines: {batch_time:.3f}s  ({len(positions) / batch_time:.0f}/s)")
+
+    # Frontier nodes: all children of each position, against make / evaluate
+    # / unmake per child (move generation left out of both)
+    frontier = [(p, p.generate_moves()) for p in positions[:args.frontier]
+                if p.winner() is None]
+    start = time.time()
+    expected = []
+    for position, moves in frontier:
+        for move in moves:
+            undo = position.make_move(move)
+            expected.append(-engine.evaluate(position))
+            position.unmake_move(undo)
+    loop_time = time.time() - start
+    start = time.time()
+    scores = [evaluate_children(position, moves)[1] for position, moves in frontier]
+    batch_time = time.time() - start
+    children = len(expected)
+    frontier_mismatches = int((np.concatenate(scores) != np.array(expected)).sum())
+    mismatches += frontier_mismatches
+    print(f"{len(frontier)} frontier nodes, {children} children, "
+          f"{frontier_mismatches} mismatches")
+    print(f"make/evaluate/unmake: {loop_time:.3f}s  ({children / loop_time:.0f} children/s)")
+    print(f"evaluate_children:    {batch_time:.3f}s  ({children / batch_time:.0f} children/s)")
+
+    # The 'owen' preset, on positions without stacks (see above)
+    owens = [engineowen.create_engine_from_state(
+                 engine.create_bitboard_from_array(position_to_wire(p)).to_state())
+             for p in positions[:args.owen]
+             if all(len(stack) <= 1 for row in p.board for stack in row)]
+    start = time.time()
+    expected = [engineowen.evaluate(position) for position in owens]
+    loop_time = time.time() - start
+    start = time.time()
+    scores = evaluate_engines(owens, preset='owen')
+    batch_time = time.time() - start
+    owen_mismatches = int((scores != np.array(expected)).sum())
+    mismatches += owen_mismatches
+    print(f"{len(owens)} unstacked positions (owen preset), {owen_mismatches} mismatches")
+    print(f"engineowen.evaluate:             {loop_time:.3f}s  ({len(owens) / loop_time:.0f}/s)")
+    print(f"evaluate_engines(preset='owen'): {batch_time:.3f}s  ({len(owens) / batch_time:.0f}/s)")
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Benchmark harness for the Gobblet engines.
+
+Runs every position of a positions file (bench_positions.json by default,
+in the create_engine_from_state format) through a fixed-depth and a
+fixed-node search with each engine given, and prints the results as JSON:
+nodes, time, NPS, time-to-depth, best move and score per position, plus
+totals per engine. Fixed limits (rather than a time budget) keep the node
+counts reproducible, so two runs of the same code search the same tree.
+
+    python bench.py                              # engine.py, defaults
+    python bench.py engine.py engineowen.py --depth 3 --nodes 20000
+    python bench.py --out before.json            # save for a later comparison
+
+engine.py-style engines (with SearchContext / SearchStats) are searched
+through iterative_deepening with a fresh context per position. Engines
+without them (engineowen.py) are driven one depth at a time through their
+own alpha_beta, with a wrapper counting the calls as nodes.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+
+import engine as codec
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_POSITIONS = os.path.join(HERE, 'bench_positions.json')
+DEFAULT_DEPTH = 4
+DEFAULT_NODES = 50000
+NO_TIME_LIMIT = 1e9     # searches end on depth / nodes, never on the clock
+
+
+def load_engine(path):
+    """Imports an engine file as a module named after the file."""
+    if not os.path.isabs(path) and not os.path.exists(path):
+        path = os.path.join(HERE, path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_positions(path):
+    with open(path) as f:
+        return json.load(f)
+
+def summarize(nodes, seconds, depth, move, score, iterations):
+    """
+    One search's result; 'iterations' is [(depth, seconds, nodes)] of each
+    completed iteration, turned into cumulative time-to-depth.
+    """
+    elapsed = 0.0
+    time_to_depth = []
+    for d, iteration_seconds, _ in iterations:
+        elapsed += iteration_seconds
+        time_to_depth.append([d, round(elapsed, 4)])
+    return {
+        'depth': depth,
+        'nodes': nodes,
+        'time': round(seconds, 4),
+        'nps': int(nodes / seconds) if seconds > 0 else 0,
+        'move': codec.move_to_array(move) if move is not None else None,
+        'score': score,
+        'time_to_depth': time_to_depth,
+    }
+
+
+####################################################
+#       ENGINES WITH SearchContext (engine.py)
+####################################################
+
+def search_with_context(module, state, max_depth=None, max_nodes=None):
+    engine = module.create_engine_from_state(state)
+    context = module.SearchContext(adaptive_time=False)
+    stats = module.SearchStats()
+    move, score = module.iterative_deepening(engine, NO_TIME_LIMIT, context, stats=stats,
+                                             max_depth=max_depth, max_nodes=max_nodes)
+    result = summarize(stats.nodes, stats.time, stats.depth, move, score, stats.iterations)
+    result['tt_hit_rate'] = stats.as_dict()['tt_hit_rate']
+    result['first_move_cutoff_rate'] = stats.as_dict()['first_move_cutoff_rate']
+    return result
+
+
+####################################################
+#       ENGINES WITHOUT CONTEXTS (engineowen.py)
+####################################################
+
+class NodeLimit(Exception):
+    pass
+
+def search_legacy(module, state, max_depth=None, max_nodes=None):
+    """
+    Iterative deepening by hand over module.alpha_beta(engine, depth, alpha,
+    beta, start_time, end_time). The module's alpha_beta is swapped for a
+    counting wrapper while we search, so its recursive calls are counted too;
+    going over max_nodes abandons the running iteration.
+    """
+    engine = module.create_engine_from_state(state)
+    if hasattr(module, 'TRANS_TABLE'):
+        module.TRANS_TABLE.clear()
+    original = module.alpha_beta
+    nodes = [0]
+
+    def counting_alpha_beta(*args, **kwargs):
+        nodes[0] += 1
+        if max_nodes is not None and nodes[0] > max_nodes:
+            raise NodeLimit()
+        return original(*args, **kwargs)
+
+    module.alpha_beta = counting_alpha_beta
+    start_time = time.time()
+    best_move, best_score, completed = None, None, 0
+    iterations = []
+    try:
+        depth = 1
+        while max_depth is None or depth <= max_depth:
+            iteration_start, iteration_nodes = time.time(), nodes[0]
+            try:
+                score, move = module.alpha_beta(engine, depth, -float('inf'), float('inf'),
+                                                start_time, start_time + NO_TIME_LIMIT)
+            except NodeLimit:
+                break
+            iterations.append((depth, time.time() - iteration_start, nodes[0] - iteration_nodes))
+            if move is None:
+                break
+            best_move, best_score, completed = move, score, depth
+            if score >= 1000000:
+                break
+            depth += 1
+    finally:
+        module.alpha_beta = original
+    seconds = time.time() - start_time
+    return summarize(nodes[0], seconds, completed, best_move, best_score, iterations)
+
+
+####################################################
+#               RUNNING THE SUITE
+####################################################
+
+def bench_engine(module, positions, depth, nodes):
+    search = search_with_context if hasattr(module, 'SearchContext') else search_legacy
+    results = []
+    for position in positions:
+        print(f"  {position['name']}...", file=sys.stderr)
+        results.append({
+            'name': position['name'],
+            'category': position['category'],
+            'fixed_depth': search(module, position['state'], max_depth=depth),
+            'fixed_nodes': search(module, position['state'], max_nodes=nodes),
+        })
+    totals = {}
+    for mode in ('fixed_depth', 'fixed_nodes'):
+        total_nodes = sum(r[mode]['nodes'] for r in results)
+        total_time = sum(r[mode]['time'] for r in results)
+        totals[mode] = {
+            'nodes': total_nodes,
+            'time': round(total_time, 4),
+            'nps': int(total_nodes / total_time) if total_time > 0 else 0,
+        }
+    return {'positions': results, 'totals': totals}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Gobblet engines on fixed positions.")
+    parser.add_argument('engines', nargs='*', default=['engine.py'],
+                        help="engine files to benchmark (default: engine.py)")
+    parser.add_argument('--positions', default=DEFAULT_POSITIONS,
+                        help="positions JSON file (default: bench_positions.json)")
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help=f"depth of the fixed-depth searches (default {DEFAULT_DEPTH})")
+    parser.add_argument('--nodes', type=int, default=DEFAULT_NODES,
+                        help=f"node budget of the fixed-node searches (default {DEFAULT_NODES})")
+    parser.add_argument('--only', help="run only the positions of this category")
+    parser.add_argument('--out', help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    positions = load_positions(args.positions)
+    if args.only:
+        positions = [p for p in positions if p['category'] == args.only]
+    report = {
+        'python': sys.version.split()[0],
+        'depth': args.depth,
+        'nodes': args.nodes,
+        'engines': {},
+    }
+    for path in args.engines:
+        print(f"Benchmarking {path}", file=sys.stderr)
+        report['engines'][os.path.basename(path)] = bench_engine(
+            load_engine(path), positions, args.depth, args.nodes)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
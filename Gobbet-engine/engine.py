@@ -1,3 +1,4 @@
+import array
 import copy
 import time
 import random
@@ -18,15 +19,145 @@ class GobbletEngine:
         self.supply1 = supply1
         self.supply2 = supply2
         self.current_player = current_player
+        # Unused pieces per [player][size]; kept in sync by make/unmake_move.
+        self.supply_counts = [None, [0] * 5, [0] * 5]
+        for player, supply in ((1, supply1), (2, supply2)):
+            for piece in supply:
+                if not piece['used']:
+                    self.supply_counts[player][piece['size']] += 1
+        # Zobrist key of the position seen through each board symmetry;
+        # sym_keys[0] (identity) is the plain zobrist_key.
+        self.sym_keys = [compute_zobrist(self, t) for t in range(len(SYMMETRIES))]
+        self.zobrist_key = self.sym_keys[0]
+
+        # Incremental line state, kept in sync by make/unmake_move through
+        # _set_top. Index 0 of the per-player lists collects empty squares
+        # and is never read.
+        #   top_owner[sq], top_size[sq]: top piece of each square (0 if empty)
+        #   line_counts[player][line]:   squares of that line topped by player
+        #   full_lines[player]:          lines with all 4 tops owned by player
+        #   open_lines[player]:          lines with >= 1 of player's tops and
+        #                                none of the opponent's
+        #   top_size_sum[player]:        sum of sizes of player's top pieces
+        #   size_hist[size]:             squares whose top has that size
+        #   top_hist[player][size]:      squares topped by player's piece of size
+        self.top_owner = [0] * NUM_SQUARES
+        self.top_size = [0] * NUM_SQUARES
+        self.size_hist = [NUM_SQUARES, 0, 0, 0, 0]
+        self.top_hist = [[NUM_SQUARES, 0, 0, 0, 0], [0] * 5, [0] * 5]
+        self.line_counts = [[0] * len(LINES) for _ in range(3)]
+        self.full_lines = [0, 0, 0]
+        self.open_lines = [0, 0, 0]
+        self.top_size_sum = [0, 0, 0]
+        for r, row in enumerate(board):
+            for c, stack in enumerate(row):
+                if stack:
+                    self._set_top(r * BOARD_SIZE + c, stack[-1]['player'], stack[-1]['size'])
+
+    def _set_top(self, sq, owner, size):
+        """
+        Record that the top of square 'sq' is now owner's piece of 'size'
+        (owner 0, size 0 for an empty square) and update the line state.
+        """
+        old = self.top_owner[sq]
+        old_size = self.top_size[sq]
+        sums = self.top_size_sum
+        sums[old] -= old_size
+        sums[owner] += size
+        self.size_hist[old_size] -= 1
+        self.size_hist[size] += 1
+        self.top_hist[old][old_size] -= 1
+        self.top_hist[owner][size] += 1
+        self.top_size[sq] = size
+        if old == owner:
+            return
+        self.top_owner[sq] = owner
+        counts1, counts2 = self.line_counts[1], self.line_counts[2]
+        old_counts = self.line_counts[old]
+        new_counts = self.line_counts[owner]
+        open_lines = self.open_lines
+        full_lines = self.full_lines
+        for line in CELL_LINES[sq]:
+            c1 = counts1[line]
+            c2 = counts2[line]
+            if not c2:
+                open_lines[1] -= c1 > 0
+            elif not c1:
+                open_lines[2] -= 1
+            if old_counts[line] == 4:
+                full_lines[old] -= 1
+            old_counts[line] -= 1
+            new_counts[line] += 1
+            if new_counts[line] == 4:
+                full_lines[owner] += 1
+            c1 = counts1[line]
+            c2 = counts2[line]
+            if not c2:
+                open_lines[1] += c1 > 0
+            elif not c1:
+                open_lines[2] += 1
+
+    def winner(self):
+        """
+        Same result as check_winner(self.board), from the incremental line
+        state: O(1) unless somebody actually has a line.
+        """
+        full_lines = self.full_lines
+        if not (full_lines[1] or full_lines[2]):
+            return None
+        counts1, counts2 = self.line_counts[1], self.line_counts[2]
+        for line in range(len(LINES)):
+            if counts1[line] == 4:
+                return 1
+            if counts2[line] == 4:
+                return 2
+        return None
+
+    def count_moves(self, player, per_piece=False):
+        """
+        Number of moves generate_moves would return for 'player', computed
+        from the top-size histograms without building any move.
+        A piece of size s (from the supply, or on top of the board) can go to
+        every square whose top is smaller than s; its own square never
+        qualifies. With per_piece=True a supply move counts once per unused
+        piece of that size (the mobility measure used by evaluate).
+        """
+        size_hist = self.size_hist
+        tops = self.top_hist[player]
+        supply = self.supply_counts[player]
+        below = 0   # squares whose top is smaller than 'size'
+        total = 0
+        for size in PIECE_SIZES:
+            below += size_hist[size - 1]
+            if per_piece:
+                total += (tops[size] + supply[size]) * below
+            else:
+                total += (tops[size] + (supply[size] > 0)) * below
+        return total
+
+    def has_any_move(self, player):
+        """True if 'player' has at least one legal move (see count_moves)."""
+        size_hist = self.size_hist
+        tops = self.top_hist[player]
+        supply = self.supply_counts[player]
+        below = 0
+        for size in PIECE_SIZES:
+            below += size_hist[size - 1]
+            if below and (tops[size] or supply[size]):
+                return True
+        return False
 
     def generate_moves(self):
         moves = []
         player = self.current_player
-        supply = self.supply1 if player == 1 else self.supply2
 
-        # Moves from supply: for each unused piece, try every board cell.
-        for piece in supply:
-            if not piece['used']:
+        # Moves from supply: the unused pieces of one size are interchangeable,
+        # so there is one move per (size, cell). The move carries no piece id;
+        # make_move / resolve_move pick a concrete unused piece of that size.
+        counts = self.supply_counts[player]
+        for size in PIECE_SIZES:
+            if counts[size]:
+                piece = {'player': player, 'size': size}
                 for r in range(len(self.board)):
                     for c in range(len(self.board[0])):
                         cell = self.board[r][c]
@@ -59,36 +190,453 @@ class GobbletEngine:
 
         return moves
 
-    def apply_move(self, move):
+    def generate_moves_to(self, squares):
         """
-        Returns a new GobbletEngine reflecting the position after 'move' is applied.
+        Like generate_moves, but only the moves whose destination square
+        (r * 4 + c) is in 'squares'. Used by the staged move picker.
         """
-        new_engine = copy.deepcopy(self)
+        moves = []
+        player = self.current_player
+        board = self.board
+        targets = []
+        for sq in squares:
+            r, c = divmod(sq, BOARD_SIZE)
+            cell = board[r][c]
+            targets.append(((r, c), cell[-1]['size'] if cell else 0))
+
+        counts = self.supply_counts[player]
+        for size in PIECE_SIZES:
+            if counts[size]:
+                piece = {'player': player, 'size': size}
+                for to, top_size in targets:
+                    if size > top_size:
+                        moves.append({'type': 'supply', 'piece': piece, 'to': to})
+
+        for r in range(BOARD_SIZE):
+            for c in range(BOARD_SIZE):
+                cell = board[r][c]
+                if cell and cell[-1]['player'] == player:
+                    piece = cell[-1]
+                    # The source square never qualifies: its top is this piece.
+                    for to, top_size in targets:
+                        if piece['size'] > top_size:
+                            moves.append({
+                                'type': 'board',
+                                'piece': piece,
+                                'from': (r, c),
+                                'to': to
+                            })
+        return moves
+
+    def make_move(self, move):
+        """
+        Applies 'move' to this engine in place and returns an undo token.
+        Pass the token to unmake_move to restore the previous position.
+        """
+        piece = move['piece']
+        player = piece['player']
+        size = piece['size']
+        source = None
+        prev_keys = self.sym_keys
+        # Supply and side-to-move terms are the same under every symmetry.
+        common = ZOBRIST_SIDE
         # Move from supply
         if move['type'] == 'supply':
-            supply = new_engine.supply1 if move['piece']['player'] == 1 else new_engine.supply2
-            for p in supply:
-                if p['id'] == move['piece']['id']:
-                    p['used'] = True
-                    break
+            source = self.supply_piece(piece)
+            if source is not None:
+                source['used'] = True
+            counts = self.supply_counts[player]
+            common ^= ZOBRIST_SUPPLY[player][size][counts[size]]
+            counts[size] -= 1
+            common ^= ZOBRIST_SUPPLY[player][size][counts[size]]
+            keys = [k ^ common for k in prev_keys]
+            placed = {
+                'player': player,
+                'size': size,
+                'id': source['id'] if source is not None else piece.get('id')
+            }
         # Move from board
-        elif move['type'] == 'board':
+        else:
             r, c = move['from']
-            new_engine.board[r][c].pop()
+            stack = self.board[r][c]
+            placed = stack.pop()
+            from_sq = r * BOARD_SIZE + c
+            depth = len(stack)
+            keys = [k ^ common ^ sym_table[from_sq][depth][player][size]
+                    for k, sym_table in zip(prev_keys, ZOBRIST_PIECE_SYM)]
+            if stack:
+                self._set_top(from_sq, stack[-1]['player'], stack[-1]['size'])
+            else:
+                self._set_top(from_sq, 0, 0)
 
         # Place piece on destination
         r_to, c_to = move['to']
-        new_engine.board[r_to][c_to].append({
-            'player': move['piece']['player'],
-            'size': move['piece']['size'],
-            'id': move['piece']['id']
-        })
+        stack = self.board[r_to][c_to]
+        to_sq = r_to * BOARD_SIZE + c_to
+        depth = len(stack)
+        for t, sym_table in enumerate(ZOBRIST_PIECE_SYM):
+            keys[t] ^= sym_table[to_sq][depth][player][size]
+        stack.append(placed)
+        self._set_top(to_sq, player, size)
 
         # Switch current player
-        new_engine.current_player = 1 if self.current_player == 2 else 2
+        self.current_player = 1 if self.current_player == 2 else 2
+        self.sym_keys = keys
+        self.zobrist_key = keys[0]
+        return (move, source, prev_keys)
+
+    def unmake_move(self, token):
+        """
+        Reverts the move that produced 'token' (as returned by make_move).
+        Moves must be unmade in the reverse order they were made.
+        """
+        move, source, prev_keys = token
+        r_to, c_to = move['to']
+        stack = self.board[r_to][c_to]
+        placed = stack.pop()
+        if stack:
+            self._set_top(r_to * BOARD_SIZE + c_to, stack[-1]['player'], stack[-1]['size'])
+        else:
+            self._set_top(r_to * BOARD_SIZE + c_to, 0, 0)
+        if move['type'] == 'supply':
+            if source is not None:
+                source['used'] = False
+            self.supply_counts[placed['player']][placed['size']] += 1
+        else:
+            r, c = move['from']
+            self.board[r][c].append(placed)
+            self._set_top(r * BOARD_SIZE + c, placed['player'], placed['size'])
+        self.current_player = 1 if self.current_player == 2 else 2
+        self.sym_keys = prev_keys
+        self.zobrist_key = prev_keys[0]
+
+    def make_null_move(self):
+        """
+        Pass the turn without moving (null-move pruning). Returns the undo
+        token for unmake_null_move.
+        """
+        prev_keys = self.sym_keys
+        self.sym_keys = [k ^ ZOBRIST_SIDE for k in prev_keys]
+        self.zobrist_key = self.sym_keys[0]
+        self.current_player = 1 if self.current_player == 2 else 2
+        return prev_keys
+
+    def unmake_null_move(self, token):
+        self.sym_keys = token
+        self.zobrist_key = token[0]
+        self.current_player = 1 if self.current_player == 2 else 2
+
+    def canonical(self):
+        """
+        Returns (key, symmetry): the smallest of the 8 symmetric Zobrist keys
+        and the index of the symmetry that maps this position onto that
+        canonical orientation. All 8 equivalent positions share the key.
+        """
+        keys = self.sym_keys
+        key = min(keys)
+        return key, keys.index(key)
+
+    def supply_piece(self, piece):
+        """
+        Returns the unused supply piece dict a supply move will take: the one
+        with piece['id'] if given, otherwise the first unused piece of
+        piece['size']. None if there is no such piece.
+        """
+        supply = self.supply1 if piece['player'] == 1 else self.supply2
+        piece_id = piece.get('id')
+        for p in supply:
+            if piece_id is not None:
+                if p['id'] == piece_id:
+                    return p
+            elif not p['used'] and p['size'] == piece['size']:
+                return p
+        return None
+
+    def resolve_move(self, move):
+        """
+        Returns 'move' with a concrete piece (including its id) for supply
+        moves, as index.html needs to apply it. Board moves are returned as is.
+        """
+        if move is None or move['type'] != 'supply':
+            return move
+        return dict(move, piece=self.supply_piece(move['piece']))
+
+    def apply_move(self, move):
+        """
+        Returns a new GobbletEngine reflecting the position after 'move' is applied.
+        Convenience wrapper around make_move; the search itself uses make/unmake.
+        """
+        new_engine = copy.deepcopy(self)
+        new_engine.make_move(move)
         return new_engine
 
 
+####################################################
+#            BITBOARD POSITION (COMPACT)
+####################################################
+
+BOARD_SIZE = 4
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+FULL_MASK = (1 << NUM_SQUARES) - 1
+PIECE_SIZES = (1, 2, 3, 4)
+PIECES_PER_SIZE = 3
+
+# The 10 winning lines (4 rows, 4 columns, 2 diagonals) as 16-bit masks.
+# Square index is r * 4 + c.
+LINE_MASKS = (
+    [sum(1 << (r * BOARD_SIZE + c) for c in range(BOARD_SIZE)) for r in range(BOARD_SIZE)] +
+    [sum(1 << (r * BOARD_SIZE + c) for r in range(BOARD_SIZE)) for c in range(BOARD_SIZE)] +
+    [sum(1 << (i * BOARD_SIZE + i) for i in range(BOARD_SIZE)),
+     sum(1 << (i * BOARD_SIZE + (BOARD_SIZE - 1 - i)) for i in range(BOARD_SIZE))]
+)
+
+
+def iter_bits(mask):
+    """
+    Yield the square index of every set bit in 'mask', lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# The same 10 lines as tuples of square indices
+LINES = tuple(tuple(iter_bits(mask)) for mask in LINE_MASKS)
+# CELL_LINES[sq]: indices into LINES of the lines through square sq
+CELL_LINES = tuple(
+    tuple(i for i, line in enumerate(LINES) if sq in line) for sq in range(NUM_SQUARES)
+)
+
+
+class BitboardEngine:
+    """
+    Compact position with the same move surface as GobbletEngine.
+
+    Stacks in Gobblet always grow strictly by size, so a cell is fully described
+    by which player (if any) owns each of the 4 sizes there. We therefore keep
+    one 16-bit occupancy mask per (player, size) layer and, for the supplies,
+    only a counter of unused pieces per (player, size).
+
+    masks[player][size]: int, bit (r * 4 + c) set if that player's piece of that
+                         size is somewhere in the stack at (r, c)
+    supply[player][size]: number of unused pieces of that size
+    Index 0 of both outer and inner lists is unused so that player and size
+    can be used directly as indices.
+
+    Moves are tuples (size, from_sq, to_sq); from_sq is None for supply moves.
+    """
+    __slots__ = ('masks', 'supply', 'current_player')
+
+    def __init__(self, masks, supply, current_player):
+        self.masks = masks
+        self.supply = supply
+        self.current_player = current_player
+
+    def occupancy(self, size):
+        """All cells holding a piece of 'size', whoever owns it."""
+        return self.masks[1][size] | self.masks[2][size]
+
+    def top_masks(self):
+        """
+        Returns (tops1, tops2): cells whose top piece belongs to player 1 / 2.
+        """
+        m1 = self.masks[1]
+        m2 = self.masks[2]
+        tops1 = tops2 = 0
+        covered = 0
+        for size in (4, 3, 2, 1):
+            tops1 |= m1[size] & ~covered
+            tops2 |= m2[size] & ~covered
+            covered |= m1[size] | m2[size]
+        return tops1, tops2
+
+    def winner(self):
+        """
+        Same contract as check_winner: 1, 2 or None (rows, then columns,
+        then diagonals are checked in that order).
+        """
+        tops1, tops2 = self.top_masks()
+        for line in LINE_MASKS:
+            if tops1 & line == line:
+                return 1
+            if tops2 & line == line:
+                return 2
+        return None
+
+    def generate_moves(self):
+        moves = []
+        player = self.current_player
+        own = self.masks[player]
+        m1 = self.masks[1]
+        m2 = self.masks[2]
+
+        # free[size]: cells whose top is strictly smaller than 'size' (or empty)
+        free = [0] * 5
+        above = 0
+        for size in (4, 3, 2, 1):
+            above |= m1[size] | m2[size]
+            free[size] = FULL_MASK & ~above
+
+        # Moves from supply: one move per distinct size and destination.
+        supply = self.supply[player]
+        for size in PIECE_SIZES:
+            if supply[size]:
+                for to_sq in iter_bits(free[size]):
+                    moves.append((size, None, to_sq))
+
+        # Moves from board: our visible pieces, to any cell they can cover.
+        above = 0
+        for size in (4, 3, 2, 1):
+            for from_sq in iter_bits(own[size] & ~above):
+                for to_sq in iter_bits(free[size]):
+                    moves.append((size, from_sq, to_sq))
+            above |= m1[size] | m2[size]
+
+        return moves
+
+    def apply_move(self, move):
+        """
+        Returns a new BitboardEngine reflecting the position after 'move' is applied.
+        """
+        size, from_sq, to_sq = move
+        player = self.current_player
+        masks = [None, self.masks[1][:], self.masks[2][:]]
+        supply = [None, self.supply[1][:], self.supply[2][:]]
+        layer = masks[player]
+        if from_sq is None:
+            supply[player][size] -= 1
+        else:
+            layer[size] &= ~(1 << from_sq)
+        layer[size] |= 1 << to_sq
+        return BitboardEngine(masks, supply, 1 if player == 2 else 2)
+
+    def to_state(self):
+        """
+        Convert back to the create_engine_from_state dict format.
+
+        Piece identity is not tracked here, so ids are reassigned the way
+        index.html numbers them: size s pieces of player p are
+        P{p}-{3s-2} .. P{p}-{3s}, with on-board pieces taking the lowest ids.
+        """
+        board = [[[] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+        supplies = {1: [], 2: []}
+        for player in (1, 2):
+            for size in PIECE_SIZES:
+                next_id = (size - 1) * PIECES_PER_SIZE + 1
+                for sq in iter_bits(self.masks[player][size]):
+                    piece_id = f'P{player}-{next_id}'
+                    board[sq // BOARD_SIZE][sq % BOARD_SIZE].append(
+                        {'player': player, 'size': size, 'id': piece_id})
+                    supplies[player].append(
+                        {'id': piece_id, 'player': player, 'size': size, 'used': True})
+                    next_id += 1
+                for _ in range(self.supply[player][size]):
+                    supplies[player].append(
+                        {'id': f'P{player}-{next_id}', 'player': player,
+                         'size': size, 'used': False})
+                    next_id += 1
+        # Stacks must be bottom-to-top, i.e. increasing size.
+        for row in board:
+            for stack in row:
+                stack.sort(key=lambda p: p['size'])
+        return {
+            'board': board,
+            'supply1': supplies[1],
+            'supply2': supplies[2],
+            'currentPlayer': self.current_player,
+        }
+
+
+####################################################
+#               BOARD SYMMETRIES
+####################################################
+
+def _symmetry(transform):
+    return tuple(transform(sq // BOARD_SIZE, sq % BOARD_SIZE) for sq in range(NUM_SQUARES))
+
+_LAST = BOARD_SIZE - 1
+# SYMMETRIES[t][sq]: square that 'sq' maps to under symmetry t (the dihedral
+# group of the square: identity, 3 rotations, 4 reflections).
+SYMMETRIES = tuple(_symmetry(f) for f in (
+    lambda r, c: r * BOARD_SIZE + c,                      # identity
+    lambda r, c: c * BOARD_SIZE + (_LAST - r),            # rotate 90
+    lambda r, c: (_LAST - r) * BOARD_SIZE + (_LAST - c),  # rotate 180
+    lambda r, c: (_LAST - c) * BOARD_SIZE + r,            # rotate 270
+    lambda r, c: r * BOARD_SIZE + (_LAST - c),            # mirror left/right
+    lambda r, c: (_LAST - r) * BOARD_SIZE + c,            # mirror top/bottom
+    lambda r, c: c * BOARD_SIZE + r,                      # main diagonal
+    lambda r, c: (_LAST - c) * BOARD_SIZE + (_LAST - r),  # anti-diagonal
+))
+# INVERSE_SYMMETRIES[t][sq]: undoes SYMMETRIES[t]
+INVERSE_SYMMETRIES = tuple(
+    tuple(perm.index(sq) for sq in range(NUM_SQUARES)) for perm in SYMMETRIES
+)
+
+def transform_move_code(move_code, perm):
+    """
+    Map a packed move (see encode_move) through a square permutation,
+    e.g. SYMMETRIES[t] into canonical orientation or INVERSE_SYMMETRIES[t] back.
+    """
+    if not move_code:
+        return 0
+    from_sq = move_code >> 7
+    if from_sq != SUPPLY_FROM:
+        from_sq = perm[from_sq]
+    return (from_sq << 7) | (perm[(move_code >> 3) & 0xF] << 3) | (move_code & 0x7)
+
+
+####################################################
+#               ZOBRIST HASHING
+####################################################
+
+# Fixed seed so keys are identical across runs (and across processes).
+_zobrist_rng = random.Random(0x60BB1E7)
+
+def _zobrist_bits():
+    return _zobrist_rng.getrandbits(64)
+
+# ZOBRIST_PIECE[square][stack depth][player][size]
+ZOBRIST_PIECE = [
+    [[None] + [[0] + [_zobrist_bits() for _ in PIECE_SIZES] for _ in (1, 2)]
+     for _ in range(len(PIECE_SIZES))]
+    for _ in range(NUM_SQUARES)
+]
+# ZOBRIST_SUPPLY[player][size][unused count]
+ZOBRIST_SUPPLY = [None] + [
+    [None] + [[_zobrist_bits() for _ in range(PIECES_PER_SIZE + 1)] for _ in PIECE_SIZES]
+    for _ in (1, 2)
+]
+# XORed in when player 2 is to move
+ZOBRIST_SIDE = _zobrist_bits()
+# ZOBRIST_PIECE_SYM[t][square]: piece keys for the position seen through SYMMETRIES[t]
+ZOBRIST_PIECE_SYM = tuple(
+    [ZOBRIST_PIECE[perm[sq]] for sq in range(NUM_SQUARES)] for perm in SYMMETRIES
+)
+
+def compute_zobrist(engine, symmetry=0):
+    """
+    Compute the 64-bit Zobrist key of 'engine' (as seen through
+    SYMMETRIES[symmetry]) from scratch. make_move / unmake_move keep
+    engine.sym_keys up to date incrementally; this is only needed when an
+    engine is built.
+    """
+    piece_keys = ZOBRIST_PIECE_SYM[symmetry]
+    key = 0
+    for r, row in enumerate(engine.board):
+        for c, stack in enumerate(row):
+            sq = r * BOARD_SIZE + c
+            for depth, piece in enumerate(stack):
+                key ^= piece_keys[sq][depth][piece['player']][piece['size']]
+    for player in (1, 2):
+        counts = engine.supply_counts[player]
+        for size in PIECE_SIZES:
+            key ^= ZOBRIST_SUPPLY[player][size][counts[size]]
+    if engine.current_player == 2:
+        key ^= ZOBRIST_SIDE
+    return key
+
+
 ####################################################
 #               HELPER FUNCTIONS
 ####################################################
@@ -135,41 +683,103 @@ def is_terminal_state(engine):
     """
     Terminal if there's a winner or no moves left.
     """
-    if check_winner(engine.board) is not None:
+    if engine.winner() is not None:
         return True
     # If no moves => terminal
-    moves = engine.generate_moves()
-    return (len(moves) == 0)
+    return not engine.has_any_move(engine.current_player)
 
 def hash_state(engine):
     """
-    Make a quick string-based hash from the board + supply + current_player.
-    Note: For serious performance, consider a Zobrist-based approach.
+    Key used for the transposition table: the engine's 64-bit Zobrist key,
+    maintained incrementally by make_move / unmake_move (see compute_zobrist).
     """
-    rows = len(engine.board)
-    cols = len(engine.board[0])
-    parts = []
-    for r in range(rows):
-        for c in range(cols):
-            stack = engine.board[r][c]
-            # We'll store top to bottom for uniqueness
-            stack_str = '-'.join([f"{p['player']}{p['size']}" for p in stack])
-            parts.append(stack_str if stack_str else "[]")
+    return engine.zobrist_key
+
 
-    # Supply info
-    s1_str = '-'.join([f"{p['size']}({p['used']})" for p in engine.supply1])
-    s2_str = '-'.join([f"{p['size']}({p['used']})" for p in engine.supply2])
-    parts.append(s1_str)
-    parts.append(s2_str)
-    parts.append(str(engine.current_player))
+####################################################
+#         PERFT (MOVE GENERATION CHECK)
+####################################################
 
-    return '|'.join(parts)
+def square_name(sq):
+    """'a1'..'d4': column letter, then row number (row 0 is '1')."""
+    return 'abcd'[sq % BOARD_SIZE] + str(sq // BOARD_SIZE + 1)
+
+def move_name(move):
+    """Short move label for perft's divide: 'S3-b2' from supply, 'a1-b2' on the board."""
+    to_sq = move['to'][0] * BOARD_SIZE + move['to'][1]
+    if move['type'] == 'supply':
+        return f"S{move['piece']['size']}-{square_name(to_sq)}"
+    return f"{square_name(move['from'][0] * BOARD_SIZE + move['from'][1])}-{square_name(to_sq)}"
+
+def perft(engine, depth, divide=False):
+    """
+    Number of leaf positions of the full move tree 'depth' plies deep: the
+    standard check that move generation (generate_moves, make_move,
+    unmake_move, count_moves for the last ply) is right, and a measure of
+    its raw speed. A won position is a leaf with no moves below it.
+    With divide=True returns {move_name: count} per root move instead, to
+    find which subtree disagrees with a reference (none at depth 0).
+    See perft.py for the command line and the stored reference counts.
+    """
+    if depth < 0:
+        raise ValueError(f"perft depth must be at least 0, got {depth}")
+    if not divide:
+        return _perft(engine, depth)
+    counts = {}
+    if depth == 0 or engine.winner() is not None:
+        return counts
+    for move in engine.generate_moves():
+        undo = engine.make_move(move)
+        counts[move_name(move)] = _perft(engine, depth - 1)
+        engine.unmake_move(undo)
+    return counts
+
+def _perft(engine, depth):
+    if depth == 0:
+        return 1
+    if engine.winner() is not None:
+        return 0
+    if depth == 1:
+        return engine.count_moves(engine.current_player)
+    total = 0
+    for move in engine.generate_moves():
+        undo = engine.make_move(move)
+        total += _perft(engine, depth - 1)
+        engine.unmake_move(undo)
+    return total
+
+def perft_bitboard(board, depth, divide=False):
+    """
+    perft on a BitboardEngine (copy-make, no counting shortcut): an
+    independent move generator to check perft's counts against.
+    """
+    if depth < 0:
+        raise ValueError(f"perft depth must be at least 0, got {depth}")
+    if divide:
+        counts = {}
+        if depth == 0 or board.winner() is not None:
+            return counts
+        for size, from_sq, to_sq in board.generate_moves():
+            name = (f"S{size}" if from_sq is None else square_name(from_sq)) + \
+                '-' + square_name(to_sq)
+            counts[name] = perft_bitboard(board.apply_move((size, from_sq, to_sq)), depth - 1)
+        return counts
+    if depth == 0:
+        return 1
+    if board.winner() is not None:
+        return 0
+    moves = board.generate_moves()
+    if depth == 1:
+        return len(moves)
+    return sum(perft_bitboard(board.apply_move(move), depth - 1) for move in moves)
 
 
 ####################################################
 #               EVALUATION FUNCTION
 ####################################################
 
+WIN_SCORE = 1000000  # score of a won position for the side to move
+
 def evaluate(engine):
     """
     A more advanced heuristic:
@@ -182,79 +792,36 @@ def evaluate(engine):
 
     Return a numerical value (the bigger, the better for engine.current_player).
     """
-    winner = check_winner(engine.board)
+    winner = engine.winner()
     current_player = engine.current_player
     opponent = 1 if current_player == 2 else 2
 
     # Immediate win check
     if winner == current_player:
-        return 1000000
+        return WIN_SCORE
     elif winner == opponent:
-        return -1000000
+        return -WIN_SCORE
 
     # Let's gather some stats:
     #  - top control / piece sizes
     #  - mobility
     #  - potential lines
-    board = engine.board
-    rows = len(board)
-    cols = len(board[0])
+    # The engine keeps top ownership and per-line counts up to date as moves
+    # are made (see GobbletEngine._set_top), so most of this is lookups.
 
-    # Top-grid: who owns each top
-    top_grid = [[0]*cols for _ in range(rows)]
-    top_size = [[0]*cols for _ in range(rows)]  # size of top piece
-    for r in range(rows):
-        for c in range(cols):
-            if board[r][c]:
-                top_grid[r][c] = board[r][c][-1]['player']
-                top_size[r][c] = board[r][c][-1]['size']
-            else:
-                top_grid[r][c] = 0
-                top_size[r][c] = 0
+    # 1. Total 'top size' for current vs. opponent
+    size_factor = engine.top_size_sum[current_player] - engine.top_size_sum[opponent]
 
-    # 1. Count total 'top size' for current vs. opponent
-    top_size_curr = 0
-    top_size_opp = 0
-    for r in range(rows):
-        for c in range(cols):
-            if top_grid[r][c] == current_player:
-                top_size_curr += top_size[r][c]
-            elif top_grid[r][c] == opponent:
-                top_size_opp += top_size[r][c]
-
-    size_factor = top_size_curr - top_size_opp
-
-    # 2. Mobility: number of legal moves for each side
-    current_mobility = len(engine.generate_moves())
-    # We can simulate flipping the player to see opponent mobility quickly:
-    opp_engine = copy.deepcopy(engine)
-    opp_engine.current_player = opponent
-    opponent_mobility = len(opp_engine.generate_moves())
+    # 2. Mobility: number of legal moves for each side (a supply move
+    #    counts once per unused piece of that size)
+    current_mobility = engine.count_moves(current_player, per_piece=True)
+    opponent_mobility = engine.count_moves(opponent, per_piece=True)
     mobility_factor = current_mobility - opponent_mobility
 
-    # 3. Potential lines
-    lines_for_current = 0
-    lines_for_opponent = 0
-
-    all_lines = []
-    # rows
-    for r in range(rows):
-        all_lines.append([(r,0),(r,1),(r,2),(r,3)])
-    # columns
-    for c in range(cols):
-        all_lines.append([(0,c),(1,c),(2,c),(3,c)])
-    # diagonals
-    all_lines.append([(0,0),(1,1),(2,2),(3,3)])
-    all_lines.append([(0,3),(1,2),(2,1),(3,0)])
-
-    for line in all_lines:
-        owners = [top_grid[r][c] for (r,c) in line]
-        # "If no opponent piece is on top, but at least one current_player piece is, it's potentially ours"
-        if opponent not in owners and any(p == current_player for p in owners):
-            lines_for_current += 1
-        # Conversely for the opponent
-        if current_player not in owners and any(p == opponent for p in owners):
-            lines_for_opponent += 1
+    # 3. Potential lines: "no opponent piece is on top, but at least one
+    # current_player piece is, so it's potentially ours" (and vice versa)
+    lines_for_current = engine.open_lines[current_player]
+    lines_for_opponent = engine.open_lines[opponent]
 
     line_factor = (lines_for_current - lines_for_opponent) * 2
 
@@ -293,113 +860,1045 @@ def order_moves(moves, engine):
     moves.sort(key=move_value, reverse=True)
     return moves
 
+def decode_move(engine, move_code):
+    """
+    Turn a packed move (see encode_move) back into a move dict for 'engine',
+    or None if it is not legal in this position (e.g. a hash collision).
+    """
+    from_sq = move_code >> 7
+    size = move_code & 0x7
+    r_to, c_to = divmod((move_code >> 3) & 0xF, BOARD_SIZE)
+    player = engine.current_player
+    dest = engine.board[r_to][c_to]
+    if dest and dest[-1]['size'] >= size:
+        return None
+    if from_sq == SUPPLY_FROM:
+        if not engine.supply_counts[player][size]:
+            return None
+        return {'type': 'supply', 'piece': {'player': player, 'size': size},
+                'to': (r_to, c_to)}
+    r, c = divmod(from_sq, BOARD_SIZE)
+    stack = engine.board[r][c]
+    if not stack or stack[-1]['player'] != player or stack[-1]['size'] != size:
+        return None
+    return {'type': 'board', 'piece': stack[-1], 'from': (r, c), 'to': (r_to, c_to)}
+
+def target_squares(engine):
+    """
+    Partition the 16 squares by what moving onto them does for the side to
+    move. Returns four disjoint sets (wins, blocks, captures, quiet):
+      wins:     the free square of a line where we have three tops
+      blocks:   squares of a line where the opponent has three tops
+      captures: other squares topped by an opponent piece (gobbles)
+      quiet:    everything else
+    """
+    player = engine.current_player
+    opponent = 1 if player == 2 else 2
+    owners = engine.top_owner
+    mine = engine.line_counts[player]
+    theirs = engine.line_counts[opponent]
+
+    wins = set()
+    blocks = set()
+    for i, line in enumerate(LINES):
+        if mine[i] == 3:
+            wins.update(sq for sq in line if owners[sq] != player)
+        if theirs[i] == 3:
+            blocks.update(line)
+    blocks -= wins
+    captures = {sq for sq in range(NUM_SQUARES) if owners[sq] == opponent}
+    captures -= wins
+    captures -= blocks
+    quiet = set(range(NUM_SQUARES)) - wins - blocks - captures
+    return wins, blocks, captures, quiet
+
+def forcing_moves(engine):
+    """
+    The moves quiescence search looks at: wins, blocks, and gobbles that
+    change who owns a line through the captured square (the line was the
+    opponent's alone, or the captured piece was their only one on it).
+    """
+    wins, blocks, captures, _ = target_squares(engine)
+    player = engine.current_player
+    opponent = 1 if player == 2 else 2
+    mine = engine.line_counts[player]
+    theirs = engine.line_counts[opponent]
+    targets = wins | blocks
+    for sq in captures:
+        if any(not mine[line] or theirs[line] == 1 for line in CELL_LINES[sq]):
+            targets.add(sq)
+    if not targets:
+        return []
+    return order_moves(engine.generate_moves_to(sorted(targets)), engine)
+
+def staged_moves(engine, tt_move=0, killers=(), history=None):
+    """
+    Generator yielding every legal move of 'engine' once, in stages:
+      1) the transposition-table move (packed code), if legal here
+      2) moves onto the square that completes one of our three-in-a-rows
+      3) moves onto a line where the opponent has three-in-a-row (blocks)
+      4) killer moves (packed codes that caused cutoffs at this ply)
+      5) other gobbling captures of an opponent's top piece
+      6) quiet moves, highest history[move code] first
+    A stage is only generated when the caller asks for its first move, so
+    a cutoff on an early move skips generating and sorting the rest.
+    The engine may be changed between yields as long as it is restored.
+    """
+    done = set()   # codes already yielded by the single-move stages
+    if tt_move:
+        move = decode_move(engine, tt_move)
+        if move is not None:
+            done.add(tt_move)
+            yield move
+
+    player = engine.current_player
+    wins, blocks, captures, quiet = target_squares(engine)
+
+    for targets in (wins, blocks, captures, quiet):
+        if targets is captures:
+            # Killers go here, unless a win/block stage already covered them
+            for killer in killers:
+                if killer and killer not in done and \
+                        ((killer >> 3) & 0xF) not in wins and ((killer >> 3) & 0xF) not in blocks:
+                    move = decode_move(engine, killer)
+                    if move is not None:
+                        done.add(killer)
+                        yield move
+        if not targets:
+            continue
+        moves = order_moves(engine.generate_moves_to(sorted(targets)), engine)
+        if targets is quiet and history is not None:
+            scores = history[player]
+            moves.sort(key=lambda m: scores[encode_move(m)], reverse=True)
+        for move in moves:
+            if done and encode_move(move) in done:
+                continue
+            yield move
+
+
+####################################################
+#             TRANSPOSITION TABLE
+####################################################
+
+# Bound flags stored with each entry
+TT_EXACT = 0
+TT_LOWER = 1   # score is a lower bound (search failed high)
+TT_UPPER = 2   # score is an upper bound (search failed low)
+
+TT_MEMORY_MB = 16       # default memory budget of a TranspositionTable
+TT_SCORE_OFFSET = 1 << 31
+SUPPLY_FROM = NUM_SQUARES  # 'from' square code used for supply moves
+
+def encode_move(move):
+    """
+    Pack a move dict into a small non-zero int (0 means 'no move'):
+    from square (16 for supply) << 7 | to square << 3 | piece size.
+    Piece ids are deliberately left out, so the code stays valid in any
+    position with the same pieces on the same squares.
+    """
+    if move['type'] == 'supply':
+        from_sq = SUPPLY_FROM
+    else:
+        from_sq = move['from'][0] * BOARD_SIZE + move['from'][1]
+    to_sq = move['to'][0] * BOARD_SIZE + move['to'][1]
+    return (from_sq << 7) | (to_sq << 3) | move['piece']['size']
+
+class TranspositionTable:
+    """
+    Fixed-capacity transposition table keyed only by the Zobrist key.
+
+    Storage is two flat 64-bit arrays (keys and packed data), so memory is
+    fixed when the table is built: 16 bytes per entry. Entries live in
+    buckets of two slots (two-tier replacement):
+      slot 0 is depth-preferred: only replaced by an equal or deeper search,
+             or by anything once its entry is from an older generation,
+      slot 1 is always-replace: takes whatever did not go into slot 0.
+    The generation is bumped once per search (new_generation), so a table
+    kept for a whole game ages out entries from earlier moves.
+
+    Packed data: score + offset (32 bits) | depth (8) | flag (2) | move (12)
+                 | generation (8)
+
+    The key slot holds key ^ data rather than the key itself, so an entry is
+    only recognised when both words were written by the same store. That
+    keeps the table usable without locks when several processes share it
+    (see create_shared / parallel_search): a torn write is simply a miss.
+    """
+    def __init__(self, memory_mb=TT_MEMORY_MB, shm=None):
+        self.generation = 0
+        self.shm = None
+        self.resize(memory_mb, shm)
+
+    @staticmethod
+    def entries_for(memory_mb):
+        """Number of entries (two per bucket) that fit in 'memory_mb'."""
+        entries = max(2, int(memory_mb * 1024 * 1024) // 16)
+        buckets = 1
+        while buckets * 4 <= entries:
+            buckets *= 2
+        return buckets * 2
+
+    @classmethod
+    def create_shared(cls, memory_mb=TT_MEMORY_MB):
+        """
+        Builds a table in a new shared memory block. Child processes attach
+        to it with attach_shared(memory_mb, table.shared_name); the creator
+        calls close(unlink=True) once they are done.
+        Native Python only (Pyodide has no shared memory).
+        """
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=cls.entries_for(memory_mb) * 16)
+        return cls(memory_mb, shm)
+
+    @classmethod
+    def attach_shared(cls, memory_mb, shared_name):
+        from multiprocessing import shared_memory
+        return cls(memory_mb, shared_memory.SharedMemory(name=shared_name))
+
+    def resize(self, memory_mb, shm=None):
+        """
+        (Re)allocate the table for a budget of 'memory_mb' megabytes, in
+        private arrays or, if given, in the SharedMemory block 'shm'.
+        """
+        self.close()
+        self.memory_mb = memory_mb
+        self.size = self.entries_for(memory_mb)
+        self.bucket_mask = (self.size >> 1) - 1
+        if shm is None:
+            self.clear()
+            return
+        self.shm = shm
+        self.view = shm.buf.cast('Q')
+        self.keys = self.view[:self.size]
+        self.data = self.view[self.size:self.size * 2]
+
+    @property
+    def shared_name(self):
+        return self.shm.name if self.shm is not None else None
+
+    def clear(self):
+        if self.shm is not None:
+            self.shm.buf[:self.size * 16] = bytes(self.size * 16)
+            return
+        self.keys = array.array('Q', [0]) * self.size
+        self.data = array.array('Q', [0]) * self.size
+
+    def close(self, unlink=False):
+        """Detach from the shared memory block (no-op for a private table)."""
+        if self.shm is None:
+            return
+        self.keys.release()
+        self.data.release()
+        self.view.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+        self.shm = None
+
+    def new_generation(self):
+        """Mark every current entry as belonging to a previous search."""
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key):
+        """
+        Returns (depth, flag, score, move_code) for 'key', or None on a miss.
+        """
+        index = (key & self.bucket_mask) << 1
+        data = self.data[index]
+        if self.keys[index] ^ data != key:
+            index += 1
+            data = self.data[index]
+            if self.keys[index] ^ data != key:
+                return None
+        if not data:
+            return None
+        return ((data >> 32) & 0xFF,
+                (data >> 40) & 0x3,
+                (data & 0xFFFFFFFF) - TT_SCORE_OFFSET,
+                (data >> 42) & 0xFFF)
+
+    def store(self, key, depth, flag, score, move_code):
+        index = (key & self.bucket_mask) << 1
+        data = ((int(score) + TT_SCORE_OFFSET) & 0xFFFFFFFF) \
+            | (min(depth, 0xFF) << 32) | (flag << 40) | (move_code << 42) \
+            | (self.generation << 54)
+        keys = self.keys
+        old = self.data[index]
+        # Depth-preferred slot: same position, empty, stale, or not deeper than us.
+        if keys[index] ^ old == key or not old or (old >> 54) != self.generation or \
+                ((old >> 32) & 0xFF) <= depth:
+            keys[index] = key ^ data
+            self.data[index] = data
+        else:
+            keys[index + 1] = key ^ data
+            self.data[index + 1] = data
+
+
+####################################################
+#               SEARCH CONTEXT
+####################################################
+
+ASPIRATION_WINDOW = 30  # default aspiration half-width, in evaluate units
+KILLER_SLOTS = 2        # killer moves remembered per ply
+QUIESCENCE_NODES = 32   # default node budget of one quiescence search
+NULL_MOVE_REDUCTION = 2 # R: null-move search depth is depth - 1 - R
+NULL_MOVE_MIN_DEPTH = 3 # no null move closer to the horizon than this
+LMR_MIN_DEPTH = 3       # no late-move reductions closer to the horizon
+LMR_MIN_MOVES = 3       # moves searched at full depth before reducing
+ZUGZWANG_MOVES = 6      # fewer legal moves than this: no null move / LMR
+TIME_CHECK_NODES = 256  # nodes between looks at the clock / should_stop
+HISTORY_SIZE = (SUPPLY_FROM << 7) + (NUM_SQUARES << 3)  # > largest move code
+
+class SearchContext:
+    """
+    Search state that outlives a single get_move call.
+
+    Keep one per game (the web worker holds GAME_CONTEXT across messages) so
+    the transposition table filled while thinking about one move is reused
+    for the next; each search only bumps the table generation. Call
+    new_game() when a new game starts.
+
+    use_symmetry: key the table by the canonical (symmetry-reduced) position
+                  and skip root moves that lead to equivalent positions.
+    use_pvs:      principal variation search: only the first move of a node
+                  gets the full window, later ones a zero window first.
+    aspiration:   half-width of the window iterative_deepening puts around
+                  the previous iteration's score (0 disables it).
+    use_quiescence: at depth 0, keep searching forcing moves (see
+                  quiescence) instead of evaluating straight away.
+    quiescence_nodes: node budget of each quiescence search.
+    use_null_move: null-move pruning (with a verification search).
+    use_lmr:      late-move reductions for quiet moves late in the list.
+    adaptive_time: let TimeManager end iterative deepening before max_time
+                  when the result is settled or the next depth can't finish.
+    trans_table:  an existing TranspositionTable to use instead of a new one
+                  (e.g. a shared one, see parallel_search).
+    root_moves:   if set, the only root moves to search, as the root_key of
+                  the positions they lead to; used by get_move_shard.
+    nodes counts alpha_beta calls of the current search, so the options
+    can be compared on node counts; completed_depth is the deepest
+    iteration iterative_deepening finished.
+
+    Stopping: alpha_beta only looks at the clock, at the node budget
+    (iterative_deepening's max_nodes) and at its should_stop (a callable,
+    e.g. one reading a flag the page sets) once every TIME_CHECK_NODES
+    nodes (next_check). When any of them says stop, stopped is set and the
+    search unwinds: every node returns as soon as its current child does,
+    before that child's partial score can update the table, the killers or
+    the history.
+
+    stats is the SearchStats being filled in by the current search, if any.
+
+    Move-ordering memory fed by beta cutoffs in alpha_beta:
+      killers[ply]:             the last KILLER_SLOTS quiet cutoff moves at ply
+      history[player][code]:    accumulated depth^2 of cutoffs by move code,
+                                i.e. by (size, from, to) for that player
+    Killers are reset and history halved at the start of every search.
+    """
+    def __init__(self, tt_memory_mb=TT_MEMORY_MB, use_symmetry=True,
+                 use_pvs=True, aspiration=ASPIRATION_WINDOW,
+                 use_quiescence=True, quiescence_nodes=QUIESCENCE_NODES,
+                 use_null_move=True, use_lmr=True, trans_table=None,
+                 adaptive_time=True):
+        if trans_table is None:
+            trans_table = TranspositionTable(tt_memory_mb)
+        self.trans_table = trans_table
+        self.use_symmetry = use_symmetry
+        self.use_pvs = use_pvs
+        self.aspiration = aspiration
+        self.use_quiescence = use_quiescence
+        self.quiescence_nodes = quiescence_nodes
+        self.quiescence_left = 0
+        self.use_null_move = use_null_move
+        self.use_lmr = use_lmr
+        self.adaptive_time = adaptive_time
+        self.root_moves = None
+        self.should_stop = None
+        self.max_nodes = None
+        self.stopped = False
+        self.next_check = 0
+        self.stats = None
+        self.nodes = 0
+        self.completed_depth = 0
+        self.killers = []
+        self.history = [None, [0] * HISTORY_SIZE, [0] * HISTORY_SIZE]
+
+    def new_search(self):
+        self.trans_table.new_generation()
+        self.stopped = False
+        self.next_check = 0
+        self.nodes = 0
+        self.completed_depth = 0
+        self.killers = []
+        for player in (1, 2):
+            self.history[player] = [h >> 1 for h in self.history[player]]
+
+    def new_game(self):
+        self.trans_table.clear()
+        self.history = [None, [0] * HISTORY_SIZE, [0] * HISTORY_SIZE]
+
+    def killers_at(self, ply):
+        while len(self.killers) <= ply:
+            self.killers.append([0] * KILLER_SLOTS)
+        return self.killers[ply]
+
+    def record_cutoff(self, engine, move, depth, ply):
+        """
+        Called after 'move' caused a beta cutoff, with the engine back at the
+        node the move was played from.
+        """
+        code = encode_move(move)
+        self.history[engine.current_player][code] += depth * depth
+        r, c = move['to']
+        if engine.top_owner[r * BOARD_SIZE + c] == 0 or \
+                engine.top_owner[r * BOARD_SIZE + c] == engine.current_player:
+            # Quiet move (no gobbling): remember it as a killer for this ply
+            slots = self.killers_at(ply)
+            if slots[0] != code:
+                slots[1:] = slots[:-1]
+                slots[0] = code
+
+
+class SearchStats:
+    """
+    Counters of one search, filled in only when one is handed to
+    iterative_deepening (context.stats is None otherwise, so alpha_beta
+    pays a single None check per node for them).
+
+      nodes, depth, time, nps: totals of the search (depth = deepest
+                               completed iteration)
+      tt_probes, tt_hits:      table lookups in alpha_beta / entries found
+      tt_stores:               results written to the table
+      cutoffs, first_move_cutoffs: beta cutoffs, and how many of them came
+                               from the first move tried (ordering quality)
+      iterations:              (depth, seconds, nodes) per completed iteration
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.depth = 0
+        self.time = 0.0
+        self.nps = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_stores = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.iterations = []
+
+    def as_dict(self):
+        """Plain dict of the counters plus derived rates (JSON-friendly)."""
+        return {
+            'nodes': self.nodes,
+            'depth': self.depth,
+            'time': round(self.time, 3),
+            'nps': self.nps,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'tt_stores': self.tt_stores,
+            'tt_hit_rate': round(self.tt_hits / self.tt_probes, 3) if self.tt_probes else 0.0,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate':
+                round(self.first_move_cutoffs / self.cutoffs, 3) if self.cutoffs else 0.0,
+            'iterations': [[depth, round(seconds, 3), nodes]
+                           for depth, seconds, nodes in self.iterations],
+        }
+
+
+GAME_CONTEXT = SearchContext()
+
+def new_game():
+    """Forget everything learned in the previous game (called by the worker)."""
+    GAME_CONTEXT.new_game()
+
+
+####################################################
+#               TIME MANAGEMENT
+####################################################
+
+TIME_SOFT_FRACTION = 0.5  # normally stop deepening after this share of max_time
+TIME_UNSTABLE_FACTOR = 2  # soft limit multiplier while the best move changes
+TIME_MIN_BRANCHING = 2.0  # lower bound on the predicted growth per iteration
+
+class TimeManager:
+    """
+    Decides between iterations whether iterative_deepening goes one deeper.
+
+    max_time is a hard limit: alpha_beta abandons the search when it is
+    reached, and a forced win ends the search at once. With 'adaptive'
+    (SearchContext.adaptive_time) we also stop early when the outcome is
+    settled or when going on is pointless:
+      - the score is a forced loss, or there is only one legal move,
+      - the next iteration is predicted not to finish before max_time; its
+        cost is the last iteration's time times the effective branching
+        factor (nodes of this iteration / nodes of the one before),
+      - the soft limit (TIME_SOFT_FRACTION of max_time) has passed. The soft
+        limit is TIME_UNSTABLE_FACTOR times longer after an iteration that
+        changed the best move, since the choice isn't settled yet.
+    Without 'adaptive' the search simply runs until max_time.
+    """
+    def __init__(self, max_time, adaptive=True):
+        self.start_time = time.time()
+        self.end_time = self.start_time + max_time
+        self.soft_time = max_time * TIME_SOFT_FRACTION
+        self.adaptive = adaptive
+        self.iteration_start = self.start_time
+        self.iteration_nodes = 0
+        self.total_nodes = 0
+        self.best_move_code = 0
+
+    def expired(self):
+        return time.time() >= self.end_time
+
+    def start_iteration(self):
+        self.iteration_start = time.time()
+
+    def iteration_done(self, score, move, nodes, single_move=False):
+        """
+        Called after a completed iteration with its score and best move and
+        the search's node count so far. Returns True to search one deeper.
+        """
+        now = time.time()
+        nodes_this = nodes - self.total_nodes
+        branching = nodes_this / self.iteration_nodes if self.iteration_nodes else 0
+        self.iteration_nodes = nodes_this
+        self.total_nodes = nodes
+        move_code = encode_move(move) if move is not None else 0
+        changed = move_code != self.best_move_code
+        self.best_move_code = move_code
+        if score >= WIN_SCORE:
+            return False    # a forced win: nothing left to find
+        if not self.adaptive:
+            return now < self.end_time
+        if move is None or single_move or score <= -WIN_SCORE:
+            return False
+        next_time = (now - self.iteration_start) * max(branching, TIME_MIN_BRANCHING)
+        if now + next_time >= self.end_time:
+            return False
+        soft_time = self.soft_time * (TIME_UNSTABLE_FACTOR if changed else 1)
+        return now - self.start_time < soft_time
+
 
 ####################################################
 #          ITERATIVE DEEPENING ALPHA-BETA
 ####################################################
 
-TRANS_TABLE = {}  # { (state_hash, depth, alpha, beta) : (score, best_move) }
+def unique_under_symmetry(engine, moves):
+    """
+    Drop moves whose resulting position is a mirror/rotation of the position
+    reached by an earlier move. Only the root uses this; inside the tree the
+    canonical transposition-table key already merges such positions.
+    """
+    keys = engine.sym_keys
+    if keys.count(keys[0]) == 1:
+        # Position has no symmetry of its own, so no two children are equivalent
+        return moves
+    seen = set()
+    unique = []
+    for move in moves:
+        undo = engine.make_move(move)
+        child_key = engine.canonical()[0]
+        engine.unmake_move(undo)
+        if child_key not in seen:
+            seen.add(child_key)
+            unique.append(move)
+    return unique
+
+def quiescence(engine, alpha, beta, context, ply):
+    """
+    Search only forcing moves (forcing_moves) below the main search's
+    horizon, so a pending capture or three-in-a-row is resolved before the
+    position is evaluated. The side to move may always 'stand pat' on the
+    static evaluation. Spends context.quiescence_left nodes at most; once
+    that runs out every node just stands pat.
+    """
+    if is_terminal_state(engine):
+        return evaluate(engine)
+    stand_pat = evaluate(engine)
+    if stand_pat >= beta or context.quiescence_left <= 0:
+        return stand_pat
+    alpha = max(alpha, stand_pat)
+    best_score = stand_pat
+
+    for move in forcing_moves(engine):
+        if context.quiescence_left <= 0:
+            break
+        context.quiescence_left -= 1
+        context.nodes += 1
+        undo = engine.make_move(move)
+        score = -quiescence(engine, -beta, -alpha, context, ply + 1)
+        engine.unmake_move(undo)
+        if score > best_score:
+            best_score = score
+        alpha = max(alpha, score)
+        if alpha >= beta:
+            break
+    return best_score
 
-def alpha_beta(engine, depth, alpha, beta, start_time, end_time):
+def is_quiet_move(engine, move):
+    """
+    True if 'move' gobbles nothing of the opponent's and does not land on a
+    line where either side has three tops (so it neither wins nor blocks).
+    """
+    r, c = move['to']
+    sq = r * BOARD_SIZE + c
+    player = engine.current_player
+    if engine.top_owner[sq] not in (0, player):
+        return False
+    mine = engine.line_counts[player]
+    theirs = engine.line_counts[1 if player == 2 else 2]
+    for line in CELL_LINES[sq]:
+        if mine[line] == 3 or theirs[line] == 3:
+            return False
+    return True
+
+def alpha_beta(engine, depth, alpha, beta, start_time, end_time, ply=0, context=None,
+               allow_null=True):
     """
     Standard alpha-beta that returns (best_score, best_move).
     We'll treat 'engine.current_player' as the maximizing side.
+    'ply' is the distance from the root; the root never returns a
+    transposition-table score, so it always comes back with a move.
+    'context' is the SearchContext whose table and options are used
+    (GAME_CONTEXT if None). With context.use_pvs this is a principal
+    variation search: moves after the first are tried with a zero window
+    around alpha and only re-searched with the full window if they beat it.
+
+    Selective options (each switchable on the context):
+      null move: if passing still scores >= beta in a reduced search, and a
+                 reduced normal search of this node confirms it, cut off.
+      LMR:       quiet moves late in the ordering are first searched one ply
+                 shallower and only get the full depth if they beat alpha.
+    Neither is used at the root, when the opponent has three-in-a-row, or
+    when the side to move has few moves (zugzwang-like positions).
+    'allow_null' is False inside a null-move or verification search.
     """
-    # Time check
-    if time.time() >= end_time:
+    if context is None:
+        context = GAME_CONTEXT
+    trans_table = context.trans_table
+    context.nodes += 1
+
+    # Time check, every TIME_CHECK_NODES nodes (with the caller's stop request)
+    if context.nodes >= context.next_check:
+        context.next_check = context.nodes + TIME_CHECK_NODES
+        if time.time() >= end_time or \
+                (context.max_nodes is not None and context.nodes >= context.max_nodes) or \
+                (context.should_stop is not None and context.should_stop()):
+            context.stopped = True
+    if context.stopped:
         # Return a static evaluation (no best_move) if out of time
         return evaluate(engine), None
 
-    if depth == 0 or is_terminal_state(engine):
+    if is_terminal_state(engine):
+        return evaluate(engine), None
+    if depth == 0:
+        if context.use_quiescence:
+            context.quiescence_left = context.quiescence_nodes
+            return quiescence(engine, alpha, beta, context, ply), None
         return evaluate(engine), None
 
-    # Check transposition table
-    state_key = (hash_state(engine), depth, alpha, beta)
-    if state_key in TRANS_TABLE:
-        cached_score, cached_move = TRANS_TABLE[state_key]
-        return cached_score, cached_move
-
-    moves = engine.generate_moves()
-    if not moves:
-        # No moves => evaluate
-        score = evaluate(engine)
-        TRANS_TABLE[state_key] = (score, None)
-        return score, None
-
-    # Move ordering
-    moves = order_moves(moves, engine)
+    # Check transposition table (moves are stored in canonical orientation)
+    if context.use_symmetry:
+        key, symmetry = engine.canonical()
+    else:
+        key, symmetry = engine.zobrist_key, 0
+    tt_move = 0
+    stats = context.stats
+    entry = trans_table.probe(key)
+    if stats is not None:
+        stats.tt_probes += 1
+        stats.tt_hits += entry is not None
+    if entry is not None:
+        tt_depth, tt_flag, tt_score, tt_move = entry
+        tt_move = transform_move_code(tt_move, INVERSE_SYMMETRIES[symmetry])
+        if ply > 0 and tt_depth >= depth:
+            if tt_flag == TT_EXACT:
+                return tt_score, None
+            if tt_flag == TT_LOWER:
+                alpha = max(alpha, tt_score)
+            else:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score, None
+    # Taken after any narrowing above: a result that fails low against a
+    # raised alpha is only an upper bound
+    alpha_orig = alpha
+
+    # Guards for null move / LMR
+    player = engine.current_player
+    selective = (ply > 0
+                 and 3 not in engine.line_counts[1 if player == 2 else 2]
+                 and engine.count_moves(player) >= ZUGZWANG_MOVES)
+
+    # Null move: give the opponent a free move; if we still reach beta the
+    # node is very likely a cutoff. Verify with a reduced normal search.
+    if context.use_null_move and allow_null and selective and \
+            depth >= NULL_MOVE_MIN_DEPTH and beta < WIN_SCORE and evaluate(engine) >= beta:
+        undo = engine.make_null_move()
+        score, _ = alpha_beta(engine, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                              start_time, end_time, ply + 1, context, allow_null=False)
+        score = -score
+        engine.unmake_null_move(undo)
+        if score >= beta:
+            score, _ = alpha_beta(engine, depth - NULL_MOVE_REDUCTION, beta - 1, beta,
+                                  start_time, end_time, ply, context, allow_null=False)
+            if score >= beta:
+                return score, None
+
+    # Moves come lazily from the staged picker, stored best move first
+    killers = context.killers_at(ply)
+    moves = staged_moves(engine, tt_move, killers, context.history)
+    if ply == 0 and context.use_symmetry:
+        moves = unique_under_symmetry(engine, list(moves))
+    if ply == 0 and context.root_moves is not None:
+        moves = [m for m in moves
+                 if root_key(engine, m, context.use_symmetry) in context.root_moves]
 
     best_score = -float('inf')
-    best_move = moves[0]  # default
+    best_move = None
+    use_pvs = context.use_pvs
+    use_lmr = context.use_lmr and selective and depth >= LMR_MIN_DEPTH
+    move_index = 0
 
     for move in moves:
-        child = engine.apply_move(move)
-        # Recurse with swapped alpha/beta and negative score to keep perspective
-        score, _ = alpha_beta(child, depth - 1, -beta, -alpha, start_time, end_time)
-        score = -score  # invert
+        reduced = (use_lmr and move_index >= LMR_MIN_MOVES and
+                   is_quiet_move(engine, move) and encode_move(move) not in killers)
+        move_index += 1
+        undo = engine.make_move(move)
+        if reduced:
+            # Late quiet move: one ply shallower, zero window
+            score, _ = alpha_beta(engine, depth - 2, -alpha - 1, -alpha, start_time,
+                                  end_time, ply + 1, context)
+            score = -score
+        # Only a reduced move that beats alpha gets the full-depth search
+        if not reduced or score > alpha:
+            # Recurse with swapped alpha/beta and negative score to keep perspective
+            if use_pvs and best_move is not None and alpha > -float('inf'):
+                # Zero-window probe: can this move beat alpha at all?
+                score, _ = alpha_beta(engine, depth - 1, -alpha - 1, -alpha, start_time,
+                                      end_time, ply + 1, context)
+                score = -score
+                if alpha < score < beta:
+                    score, _ = alpha_beta(engine, depth - 1, -beta, -alpha, start_time,
+                                          end_time, ply + 1, context)
+                    score = -score
+            else:
+                score, _ = alpha_beta(engine, depth - 1, -beta, -alpha, start_time,
+                                      end_time, ply + 1, context)
+                score = -score  # invert
+        engine.unmake_move(undo)
+        if context.stopped:
+            # The child's score is partial: keep it out of the table, the
+            # killers and the history, which all outlive this search
+            return best_score, best_move
 
         if score > best_score:
             best_score = score
             best_move = move
         alpha = max(alpha, score)
         if alpha >= beta:
+            context.record_cutoff(engine, move, depth, ply)
+            if stats is not None:
+                stats.cutoffs += 1
+                stats.first_move_cutoffs += move_index == 1
             break
 
-        if time.time() >= end_time:
-            break
+    if best_move is None:
+        # No moves => evaluate
+        score = evaluate(engine)
+        trans_table.store(key, depth, TT_EXACT, score, 0)
+        if stats is not None:
+            stats.tt_stores += 1
+        return score, None
 
-    TRANS_TABLE[state_key] = (best_score, best_move)
+    if ply == 0 and context.root_moves is not None:
+        # Only part of the root was searched: not a score for the position
+        return best_score, best_move
+
+    if best_score <= alpha_orig:
+        flag = TT_UPPER
+    elif best_score >= beta:
+        flag = TT_LOWER
+    else:
+        flag = TT_EXACT
+    if stats is not None:
+        stats.tt_stores += 1
+    trans_table.store(key, depth, flag, best_score,
+                      transform_move_code(encode_move(best_move), SYMMETRIES[symmetry]))
     return best_score, best_move
 
 
-def iterative_deepening(engine, max_time=20.0):
+def iterative_deepening(engine, max_time=20.0, context=None, start_depth=1,
+                        on_depth=None, should_stop=None, stats=None,
+                        max_depth=None, max_nodes=None):
     """
     Iterative deepening up to ~max_time seconds.
-    We'll try depth=1,2,3,... until time is up, caching results.
+    We'll try depth=1,2,3,... until a TimeManager says stop, caching results
+    in the context's transposition table (kept from earlier moves of the game).
+    From depth 2 on, each iteration first searches an aspiration window of
+    +/- context.aspiration around the previous score and re-searches with
+    the failing side opened up if the result falls outside it.
+    start_depth lets parallel_search's helpers start at a different depth.
+
+    on_depth(depth, score, move, nodes, nps), if given, is called after each
+    completed iteration with its best move. should_stop() is polled during
+    the search (see SearchContext); returning true ends it early with the
+    best move of the last completed iteration. A SearchStats passed as
+    'stats' is filled in with the search's counters.
+    max_depth stops after that iteration and max_nodes once the search has
+    used that many nodes (checked every TIME_CHECK_NODES), for fixed-depth
+    and fixed-node searches (see bench.py).
+    Depth 1 is always finished, whatever the clock, should_stop or max_nodes
+    say, so that there is a move to play; it takes a few hundred nodes.
     """
-    global TRANS_TABLE
-    TRANS_TABLE.clear()
-    start_time = time.time()
-    end_time = start_time + max_time
+    if context is None:
+        context = GAME_CONTEXT
+    context.new_search()
+    context.stats = stats
+    timer = TimeManager(max_time, context.adaptive_time)
+    start_time, end_time = timer.start_time, timer.end_time
+    # A lone legal move needs no deep search (a root shard may hold just one
+    # move, but its score still has to hold up against the other shards').
+    single_move = context.root_moves is None and len(engine.generate_moves()) == 1
 
     best_move = None
     best_score = None
-    depth = 1
+    depth = start_depth
+    stoppable = False
 
     while True:
-        if time.time() >= end_time:
+        if depth > 1 and not stoppable:
+            context.should_stop = should_stop
+            context.max_nodes = max_nodes
+            context.next_check = context.nodes
+            stoppable = True
+        if stoppable and (context.stopped or timer.expired()):
             break
-
-        score, move = alpha_beta(engine, depth, -float('inf'), float('inf'), start_time, end_time)
+        timer.start_iteration()
+
+        alpha, beta = -float('inf'), float('inf')
+        if context.aspiration and best_score is not None and abs(best_score) < WIN_SCORE:
+            alpha = best_score - context.aspiration
+            beta = best_score + context.aspiration
+
+        while True:
+            score, move = alpha_beta(engine, depth, alpha, beta, start_time,
+                                     end_time if stoppable else float('inf'),
+                                     context=context)
+            if context.stopped:
+                break
+            if score <= alpha:
+                alpha = -float('inf')   # failed low: true score is lower
+            elif score >= beta:
+                beta = float('inf')     # failed high: true score is higher
+            else:
+                break
 
         # if time's up in the middle of alpha-beta, we'll just break
-        if time.time() >= end_time:
+        if context.stopped:
             break
 
         if move is not None:
             best_move = move
             best_score = score
+            context.completed_depth = depth
+            if on_depth is not None:
+                elapsed = time.time() - start_time
+                on_depth(depth, score, move, context.nodes,
+                         int(context.nodes / elapsed) if elapsed > 0 else 0)
+            if stats is not None:
+                stats.iterations.append((depth, time.time() - timer.iteration_start,
+                                         context.nodes - timer.total_nodes))
 
         depth += 1
-        # If we found a "winning" move, might as well stop
-        if best_score and best_score >= 1000000:
+        if not timer.iteration_done(score, move, context.nodes, single_move):
+            break
+        if max_depth is not None and depth > max_depth:
             break
 
+    context.should_stop = None
+    context.max_nodes = None
+    context.stats = None
+    if stats is not None:
+        stats.nodes = context.nodes
+        stats.depth = context.completed_depth
+        stats.time = time.time() - start_time
+        stats.nps = int(stats.nodes / stats.time) if stats.time > 0 else 0
     return best_move, best_score
 
 
+####################################################
+#        PARALLEL SEARCH (native Python only)
+####################################################
+
+def _smp_helper(job):
+    """
+    One Lazy-SMP helper process: iterative deepening on its own copy of the
+    position, sharing the transposition table. Returns
+    (completed_depth, score, move_code, nodes).
+    """
+    engine, end_time, tt_memory_mb, shared_name, start_depth = job
+    table = TranspositionTable.attach_shared(tt_memory_mb, shared_name)
+    try:
+        context = SearchContext(trans_table=table)
+        move, score = iterative_deepening(engine, max(0.0, end_time - time.time()),
+                                          context, start_depth=start_depth)
+        return (context.completed_depth, score,
+                encode_move(move) if move is not None else 0, context.nodes)
+    finally:
+        table.close()
+
+def parallel_search(engine, max_time=20.0, workers=2, tt_memory_mb=TT_MEMORY_MB):
+    """
+    Lazy-SMP search over 'workers' processes for the native CLI path.
+
+    Every process runs iterative_deepening on the whole root, all of them
+    sharing one transposition table in shared memory, so what one finds
+    (bounds, best moves) steers and cuts the others. Helpers start at
+    alternating depths (1, 2, 1, 2, ...) so they don't all walk the tree in
+    lockstep. The result comes from whichever process completed the
+    deepest iteration, the main process winning ties.
+
+    Returns (best_move, best_score, nodes) with nodes summed over all
+    processes. Not available under Pyodide (no processes there).
+    """
+    import multiprocessing
+
+    table = TranspositionTable.create_shared(tt_memory_mb)
+    try:
+        end_time = time.time() + max_time
+        jobs = [(engine, end_time, tt_memory_mb, table.shared_name, 1 + helper % 2)
+                for helper in range(1, workers)]
+        with multiprocessing.Pool(workers - 1) as pool:
+            pending = pool.map_async(_smp_helper, jobs)
+            context = SearchContext(trans_table=table)
+            move, score = iterative_deepening(engine, max_time, context)
+            results = pending.get()
+    finally:
+        table.close(unlink=True)
+
+    best_depth = context.completed_depth
+    nodes = context.nodes
+    for depth, helper_score, move_code, helper_nodes in results:
+        nodes += helper_nodes
+        if depth > best_depth and move_code:
+            helper_move = decode_move(engine, move_code)
+            if helper_move is not None:
+                best_depth, move, score = depth, helper_move, helper_score
+    return move, score, nodes
+
+
+####################################################
+#        ROOT SPLITTING (web worker pool)
+####################################################
+
+def root_key(engine, move, use_symmetry=True):
+    """
+    Key of the position 'move' leads to: the canonical key with
+    use_symmetry, so all moves to mirrored positions share it.
+    """
+    undo = engine.make_move(move)
+    key = engine.canonical()[0] if use_symmetry else engine.zobrist_key
+    engine.unmake_move(undo)
+    return key
+
+def root_shard(engine, shard, shards, use_symmetry=True):
+    """
+    root_key of the root moves searched by worker 'shard' (0-based) of
+    'shards': every shards-th of the distinct keys in sorted order, so
+    each worker gets an arbitrary mix of good and bad moves. Keys don't
+    depend on move order, so workers whose tables, killers and history
+    order the root differently still split it without overlap or gaps,
+    whichever move of a symmetric group their root keeps.
+    """
+    keys = sorted({root_key(engine, m, use_symmetry) for m in engine.generate_moves()})
+    return {key for i, key in enumerate(keys) if i % shards == shard}
+
+def get_move_shard(engine, max_time, shard, shards, context=None,
+                   on_depth=None, should_stop=None, return_stats=False):
+    """
+    get_move for one worker of a pool: iterative deepening over this
+    worker's root_shard only. Returns a dict with the resolved 'move' (None
+    if the shard is empty), its 'score', the completed 'depth' and
+    'depths': [depth, score, move as move_to_array] for every completed
+    iteration. Scores of different depths don't compare (they swing between
+    odd and even depths), so the caller should compare shards at the
+    deepest depth they all completed.
+    A shard's TimeManager would judge from its own share of the root when
+    to stop, so shards search without the adaptive stop, all to the same
+    deadline: TIME_SOFT_FRACTION of max_time, where a single adaptive search
+    normally stops. A forced win still ends a shard at once.
+    on_depth and should_stop are passed on to iterative_deepening. With
+    return_stats the dict also has 'stats' (SearchStats.as_dict()).
+    """
+    if context is None:
+        context = GAME_CONTEXT
+    context.root_moves = root_shard(engine, shard, shards, context.use_symmetry)
+    adaptive_time = context.adaptive_time
+    context.adaptive_time = False
+    depths = []
+
+    def record_depth(depth, score, move, nodes, nps):
+        depths.append([depth, score, move_to_array(move)])
+        if on_depth is not None:
+            on_depth(depth, score, move, nodes, nps)
+
+    try:
+        if not context.root_moves:
+            return {'move': None, 'score': None, 'depth': 0, 'depths': []}
+        stats = SearchStats() if return_stats else None
+        move, score = iterative_deepening(engine, max_time=max_time * TIME_SOFT_FRACTION,
+                                          context=context, on_depth=record_depth,
+                                          should_stop=should_stop, stats=stats)
+    finally:
+        context.root_moves = None
+        context.adaptive_time = adaptive_time
+    print(f"Shard {shard}/{shards}: {move} with score {score} at depth {context.completed_depth}")
+    result = {'move': engine.resolve_move(move), 'score': score,
+              'depth': context.completed_depth, 'depths': depths}
+    if stats is not None:
+        result['stats'] = stats.as_dict()
+    return result
+
+
 ####################################################
 #            MAIN get_move FUNCTION
 ####################################################
 
-def get_move(engine, max_time=20.0):
+def get_move(engine, max_time=20.0, context=None, workers=1,
+             on_depth=None, should_stop=None, return_stats=False):
     """
     Will think up to `max_time` seconds using iterative deepening alpha-beta.
     Returns the best move found within that time.
+    `context` is the game's SearchContext (defaults to GAME_CONTEXT); pass a
+    fresh SearchContext() to search without anything learned earlier.
+    workers > 1 searches with parallel_search instead (native Python only;
+    it uses its own shared table, so `context` is not used).
+    on_depth / should_stop report progress and stop the search early, see
+    iterative_deepening (single-process search only).
+    With return_stats, returns (move, stats) where stats is a dict of the
+    search's SearchStats. parallel_search's helpers keep their counters in
+    their own processes, so for it the dict has only nodes, time and nps.
     """
     print(f"AI thinking for up to ~{max_time} seconds...")
-    move, score = iterative_deepening(engine, max_time=max_time)
+    if workers > 1:
+        start_time = time.time()
+        move, score, nodes = parallel_search(engine, max_time, workers)
+        print(f"{workers} workers searched {nodes} nodes")
+        seconds = time.time() - start_time
+        stats = {'nodes': nodes, 'time': round(seconds, 3),
+                 'nps': int(nodes / seconds) if seconds > 0 else 0}
+    else:
+        search_stats = SearchStats() if return_stats else None
+        move, score = iterative_deepening(engine, max_time=max_time, context=context,
+                                          on_depth=on_depth, should_stop=should_stop,
+                                          stats=search_stats)
+        stats = search_stats.as_dict() if return_stats else None
+    move = engine.resolve_move(move)
     print(f"Chosen move: {move} with score {score}")
+    if return_stats:
+        return move, stats
     return move
 
 
@@ -422,11 +1921,79 @@ def create_engine_from_state(state):
     current_player = state['currentPlayer']
     return GobbletEngine(board, supply1, supply2, current_player)
 
+def create_bitboard_from_state(state):
+    """
+    Same input as create_engine_from_state, but builds the compact BitboardEngine.
+    """
+    masks = [None, [0] * 5, [0] * 5]
+    for r, row in enumerate(state['board']):
+        for c, stack in enumerate(row):
+            for piece in stack:
+                masks[piece['player']][piece['size']] |= 1 << (r * BOARD_SIZE + c)
+    supply = [None, [0] * 5, [0] * 5]
+    for player, pieces in ((1, state['supply1']), (2, state['supply2'])):
+        for piece in pieces:
+            if not piece['used']:
+                supply[player][piece['size']] += 1
+    return BitboardEngine(masks, supply, state['currentPlayer'])
+
+####################################################
+#       COMPACT WIRE FORMAT (web worker)
+####################################################
+
+# A position as WIRE_LENGTH ints, cheap to pass from JavaScript as a typed array:
+#   [0:16]   one code per square (sq = r*4 + c): sum of owner * 3**(size-1)
+#            over the pieces in the stack (owner 0 = none, 1, 2). A stack
+#            holds each size at most once, in increasing size, so this is
+#            the whole stack.
+#   [16:24]  unused supply pieces: player 1 sizes 1-4, then player 2 sizes 1-4
+#   [24]     player to move
+# A move goes back as [from_sq (-1 for a supply piece), to_sq, size].
+WIRE_LENGTH = NUM_SQUARES + 2 * len(PIECE_SIZES) + 1
+
+def create_bitboard_from_array(wire):
+    """Builds a BitboardEngine from the compact wire format."""
+    masks = [None, [0] * 5, [0] * 5]
+    for sq in range(NUM_SQUARES):
+        code = wire[sq]
+        for size in PIECE_SIZES:
+            owner = code % 3
+            code //= 3
+            if owner:
+                masks[owner][size] |= 1 << sq
+    supply = [None, [0] + list(wire[16:20]), [0] + list(wire[20:24])]
+    return BitboardEngine(masks, supply, wire[24])
+
+def create_engine_from_array(wire):
+    """
+    Same as create_engine_from_state, from the compact wire format (piece
+    ids are reassigned as in BitboardEngine.to_state).
+    """
+    return create_engine_from_state(create_bitboard_from_array(wire).to_state())
+
+def move_to_array(move):
+    """A move dict in the compact wire format: [from_sq or -1, to_sq, size]."""
+    if move['type'] == 'supply':
+        from_sq = -1
+    else:
+        from_sq = move['from'][0] * BOARD_SIZE + move['from'][1]
+    return [from_sq, move['to'][0] * BOARD_SIZE + move['to'][1], move['piece']['size']]
+
 ####################################################
 #               DEMO / TEST
 ####################################################
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Search the opening position.")
+    parser.add_argument('--time', type=float, default=5.0,
+                        help="seconds to think (default 5)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="search processes; >1 uses parallel_search")
+    parser.add_argument('--stats', action='store_true',
+                        help="print the search statistics")
+    args = parser.parse_args()
+
     board = [[[] for _ in range(4)] for _ in range(4)]
     
     def create_supply(player):
@@ -447,3 +2014,7 @@ if __name__ == '__main__':
     supply2 = create_supply(2)
 
     engine = GobbletEngine(board, supply1, supply2, current_player=1)
+    result = get_move(engine, max_time=args.time, workers=args.workers,
+                      return_stats=args.stats)
+    if args.stats:
+        print(result[1])
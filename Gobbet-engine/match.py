@@ -0,0 +1,331 @@
+"""
+Headless engine-vs-engine matches.
+
+Plays games between two engine files (any module with
+create_engine_from_state and iterative_deepening, e.g. engine.py and
+engineowen.py) across a process pool and reports the result from the first
+engine's point of view: wins/draws/losses, score and an Elo difference with
+a 95% confidence interval (see summarize).
+
+    python match.py engine.py engineowen.py --games 200 --time 0.2
+    python match.py engine.py engine_new.py --games 2000 --depth 4 --workers 8
+    python match.py engine.py engineowen.py --book openings.json --json result.json
+
+Games come in pairs from the same opening with colours swapped, so neither
+engine profits from a lucky opening. Openings are --random-plies random
+moves from the start (seeded, so runs are repeatable) or, with --book, the
+move lists of a JSON file: [[[from_sq or -1, to_sq, size], ...], ...] in
+engine.py's compact move format.
+
+The referee is engine.py's rules: a move must be one of its generate_moves.
+After a move, a line of the mover's wins; otherwise a line of the
+opponent's (uncovered by the move) wins for the opponent. A position
+repeated REPETITION_COUNT times, --max-moves plies, or a side without legal
+moves is a draw; an illegal or missing move loses.
+"""
+import argparse
+import copy
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import engine as referee
+from bench import load_engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPETITION_COUNT = 3
+DEFAULT_MAX_MOVES = 200
+DEFAULT_RANDOM_PLIES = 2
+NO_TIME_LIMIT = 1e9
+CONFIDENCE_Z = 1.96      # 95% interval
+PRIOR_GAMES = 1          # pseudo wins and losses added to the estimate, see summarize
+
+
+def start_state():
+    def create_supply(player):
+        return [{'id': f'P{player}-{3 * (size - 1) + k + 1}', 'player': player,
+                 'size': size, 'used': False}
+                for size in referee.PIECE_SIZES for k in range(referee.PIECES_PER_SIZE)]
+    return {
+        'board': [[[] for _ in range(referee.BOARD_SIZE)] for _ in range(referee.BOARD_SIZE)],
+        'supply1': create_supply(1),
+        'supply2': create_supply(2),
+        'currentPlayer': 1,
+    }
+
+def apply_to_state(state, move):
+    """
+    Plays a compact move [from_sq or -1, to_sq, size] on a state dict the
+    way index.html does (a supply move uses the first unused piece).
+    """
+    from_sq, to_sq, size = move
+    player = state['currentPlayer']
+    if from_sq < 0:
+        pieces = state['supply1'] if player == 1 else state['supply2']
+        piece = next(p for p in pieces if not p['used'] and p['size'] == size)
+        piece['used'] = True
+        piece = {'id': piece['id'], 'player': player, 'size': size}
+    else:
+        piece = state['board'][from_sq // 4][from_sq % 4].pop()
+    state['board'][to_sq // 4][to_sq % 4].append(piece)
+    state['currentPlayer'] = 1 if player == 2 else 2
+
+def legal_moves(state):
+    """Compact moves allowed by the referee in 'state'."""
+    position = referee.create_engine_from_state(copy.deepcopy(state))
+    return [referee.move_to_array(m) for m in position.generate_moves()]
+
+
+####################################################
+#               CHOOSING MOVES
+####################################################
+
+class Player:
+    """
+    One side of one game: an engine module plus its search limits. Engines
+    with a SearchContext keep one for the whole game (as the web worker
+    does); others are searched through their own iterative_deepening, or
+    alpha_beta depth by depth for a fixed depth.
+    """
+    def __init__(self, module, limits):
+        self.module = module
+        self.limits = limits
+        self.context = None
+        if hasattr(module, 'SearchContext'):
+            fixed = limits['depth'] is not None or limits['nodes'] is not None
+            self.context = module.SearchContext(adaptive_time=not fixed)
+
+    def choose(self, state):
+        module, limits = self.module, self.limits
+        position = module.create_engine_from_state(copy.deepcopy(state))
+        max_time = limits['time'] if limits['time'] is not None else NO_TIME_LIMIT
+        if self.context is not None:
+            move, _ = module.iterative_deepening(position, max_time, self.context,
+                                                 max_depth=limits['depth'],
+                                                 max_nodes=limits['nodes'])
+        elif limits['depth'] is not None:
+            move = self._legacy_fixed_depth(position, limits['depth'])
+        else:
+            move, _ = module.iterative_deepening(position, max_time)
+        return referee.move_to_array(move) if move is not None else None
+
+    def _legacy_fixed_depth(self, position, depth):
+        module = self.module
+        if hasattr(module, 'TRANS_TABLE'):
+            module.TRANS_TABLE.clear()
+        start_time = time.time()
+        move = None
+        for d in range(1, depth + 1):
+            score, best = module.alpha_beta(position, d, -float('inf'), float('inf'),
+                                            start_time, start_time + NO_TIME_LIMIT)
+            if best is None:
+                break
+            move = best
+            if score >= referee.WIN_SCORE:
+                break
+        return move
+
+
+####################################################
+#               PLAYING A GAME
+####################################################
+
+_MODULES = {}
+
+def _module(path):
+    """Engine modules, loaded once per worker process."""
+    if path not in _MODULES:
+        _MODULES[path] = load_engine(path)
+    return _MODULES[path]
+
+def play_game(job):
+    """
+    Plays one game; 'job' is (game index, engine path for player 1, engine
+    path for player 2, limits, opening moves, max plies). Returns a dict
+    with the index, 'winner' (1, 2 or None) and the 'reason' and 'plies'.
+    """
+    index, path1, path2, limits, opening, max_moves = job
+    players = {1: Player(_module(path1), limits), 2: Player(_module(path2), limits)}
+    state = start_state()
+    seen = {}
+    plies = 0
+
+    def finish(winner, reason):
+        return {'index': index, 'winner': winner, 'reason': reason, 'plies': plies}
+
+    while True:
+        mover = state['currentPlayer']
+        legal = legal_moves(state)
+        if not legal:
+            return finish(None, 'no moves')
+        if plies < len(opening):
+            move = list(opening[plies])
+        else:
+            move = players[mover].choose(state)
+        if move is None:
+            return finish(1 if mover == 2 else 2, 'no move')
+        if move not in legal:
+            return finish(1 if mover == 2 else 2, 'illegal move')
+        apply_to_state(state, move)
+        plies += 1
+
+        position = referee.create_engine_from_state(copy.deepcopy(state))
+        opponent = 1 if mover == 2 else 2
+        if position.full_lines[mover]:
+            return finish(mover, 'line')
+        if position.full_lines[opponent]:
+            return finish(opponent, 'uncovered line')
+        seen[position.zobrist_key] = seen.get(position.zobrist_key, 0) + 1
+        if seen[position.zobrist_key] >= REPETITION_COUNT:
+            return finish(None, 'repetition')
+        if plies >= max_moves:
+            return finish(None, 'move cap')
+
+def random_opening(rng, plies):
+    """'plies' random moves from the start, never one that ends the game."""
+    state = start_state()
+    moves = []
+    for _ in range(plies):
+        candidates = []
+        for move in legal_moves(state):
+            child = copy.deepcopy(state)
+            apply_to_state(child, move)
+            position = referee.create_engine_from_state(child)
+            if not (position.full_lines[1] or position.full_lines[2]):
+                candidates.append(move)
+        if not candidates:
+            break
+        move = rng.choice(candidates)
+        apply_to_state(state, move)
+        moves.append(move)
+    return moves
+
+
+####################################################
+#               RESULTS AND ELO
+####################################################
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1) + 0.0   # no '-0.0' for an even score
+
+def summarize(outcomes):
+    """
+    W/D/L, score and Elo with a 95% confidence interval from a list of
+    1 / 0.5 / 0 results. Elo and interval count PRIOR_GAMES extra wins and
+    as many losses, so a one-sided or tiny sample gives a finite estimate
+    instead of the +/-2400 clamp, and never a zero variance. The interval
+    is Wilson's (it stays inside 0..1 and is wide for few games) with the
+    trinomial variance of the per-game scores, which draws make smaller
+    than the binomial score * (1 - score).
+    """
+    n = len(outcomes)
+    wins = outcomes.count(1)
+    draws = outcomes.count(0.5)
+    losses = outcomes.count(0)
+    games = n + 2 * PRIOR_GAMES
+    p = (wins + PRIOR_GAMES + draws / 2) / games
+    variance = ((wins + PRIOR_GAMES) * (1 - p) ** 2 + draws * (0.5 - p) ** 2 +
+                (losses + PRIOR_GAMES) * p ** 2) / games
+    # Binomial-equivalent sample size of that variance
+    effective = games * p * (1 - p) / variance
+    z2 = CONFIDENCE_Z ** 2 / effective
+    center = (p + z2 / 2) / (1 + z2)
+    margin = CONFIDENCE_Z * math.sqrt(p * (1 - p) / effective + z2 / (4 * effective)) / (1 + z2)
+    return {
+        'games': n,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'score': round((wins + draws / 2) / n, 4) if n else 0.5,
+        'elo': round(elo_from_score(p), 1),
+        'elo_low': round(elo_from_score(center - margin), 1),
+        'elo_high': round(elo_from_score(center + margin), 1),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play engine-vs-engine matches.")
+    parser.add_argument('engine_a', help="first engine file (results are from its side)")
+    parser.add_argument('engine_b', help="second engine file")
+    parser.add_argument('--games', type=int, default=100,
+                        help="number of games, rounded up to whole colour-swapped pairs")
+    parser.add_argument('--time', type=float, help="seconds per move (default 0.2 "
+                        "unless --depth or --nodes is given)")
+    parser.add_argument('--depth', type=int, help="fixed search depth per move")
+    parser.add_argument('--nodes', type=int,
+                        help="node budget per move (engines with SearchContext only)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="parallel games (default: CPU count)")
+    parser.add_argument('--random-plies', type=int, default=DEFAULT_RANDOM_PLIES,
+                        help=f"random opening moves (default {DEFAULT_RANDOM_PLIES})")
+    parser.add_argument('--book', help="JSON file of opening move lists instead")
+    parser.add_argument('--max-moves', type=int, default=DEFAULT_MAX_MOVES,
+                        help=f"plies before a game is drawn (default {DEFAULT_MAX_MOVES})")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the random openings")
+    parser.add_argument('--json', help="also write the result as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.time is None and args.depth is None and args.nodes is None:
+        args.time = 0.2
+    limits = {'time': args.time, 'depth': args.depth, 'nodes': args.nodes}
+    paths = []
+    for path in (args.engine_a, args.engine_b):
+        if not os.path.isabs(path) and not os.path.exists(path):
+            path = os.path.join(HERE, path)
+        paths.append(os.path.abspath(path))
+        if args.nodes is not None and not hasattr(_module(paths[-1]), 'SearchContext'):
+            parser.error(f"{path} has no SearchContext, so --nodes can't limit it")
+
+    pairs = (args.games + 1) // 2
+    if args.book:
+        with open(args.book) as f:
+            book = json.load(f)
+        openings = [book[i % len(book)] for i in range(pairs)]
+    else:
+        rng = random.Random(args.seed)
+        openings = [random_opening(rng, args.random_plies) for _ in range(pairs)]
+
+    # Game 2k: engine A is player 1; game 2k+1: same opening, A is player 2.
+    jobs = []
+    for pair, opening in enumerate(openings):
+        jobs.append((2 * pair, paths[0], paths[1], limits, opening, args.max_moves))
+        jobs.append((2 * pair + 1, paths[1], paths[0], limits, opening, args.max_moves))
+
+    outcomes = []
+    reasons = {}
+    start = time.time()
+    with multiprocessing.Pool(args.workers) as pool:
+        for result in pool.imap_unordered(play_game, jobs):
+            a_side = 1 if result['index'] % 2 == 0 else 2
+            if result['winner'] is None:
+                outcomes.append(0.5)
+            else:
+                outcomes.append(1 if result['winner'] == a_side else 0)
+            reasons[result['reason']] = reasons.get(result['reason'], 0) + 1
+            s = summarize(outcomes)
+            print(f"game {len(outcomes)}/{len(jobs)}: +{s['wins']} ={s['draws']} -{s['losses']}"
+                  f"  elo {s['elo']:+.1f}", file=sys.stderr)
+
+    summary = summarize(outcomes)
+    summary.update({
+        'engine_a': args.engine_a,
+        'engine_b': args.engine_b,
+        'limits': limits,
+        'endings': reasons,
+        'seconds': round(time.time() - start, 1),
+    })
+    print(f"{args.engine_a} vs {args.engine_b}: +{summary['wins']} ={summary['draws']} "
+          f"-{summary['losses']} ({summary['games']} games), score {summary['score']:.3f}, "
+          f"Elo {summary['elo']:+.1f} [{summary['elo_low']:+.1f}, {summary['elo_high']:+.1f}]")
+    print(f"endings: {reasons}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Perft: count the leaf positions of the move tree to check move generation.
+
+    python perft.py                         # start position, depths 1-3
+    python perft.py midgame-14 4            # a bench_positions.json position
+    python perft.py start 3 --divide        # counts per root move
+    python perft.py --check                 # all stored references
+    python perft.py --check 3               # ... up to depth 3
+    python perft.py start 3 --bitboard      # cross-check with BitboardEngine
+
+Counts come from engine.perft (make/unmake_move, count_moves on the last
+ply). --bitboard recounts with the independent BitboardEngine generator
+and flags any difference; --divide then narrows it down to a root move.
+perft_reference.json holds counts agreed on by both generators for the
+positions of bench_positions.json; --check compares against it, so any
+change to move generation can be verified before it is used.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import engine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+POSITIONS_FILE = os.path.join(HERE, 'bench_positions.json')
+REFERENCE_FILE = os.path.join(HERE, 'perft_reference.json')
+DEFAULT_DEPTH = 3
+
+
+def load_positions():
+    with open(POSITIONS_FILE) as f:
+        return {p['name']: p['state'] for p in json.load(f)}
+
+def load_reference():
+    with open(REFERENCE_FILE) as f:
+        return json.load(f)
+
+def timed_perft(state, depth, bitboard=False):
+    """(count, seconds) for 'state' at 'depth', with either generator."""
+    start = time.time()
+    if bitboard:
+        count = engine.perft_bitboard(engine.create_bitboard_from_state(state), depth)
+    else:
+        count = engine.perft(engine.create_engine_from_state(state), depth)
+    return count, time.time() - start
+
+def report(name, depth, count, seconds):
+    nps = int(count / seconds) if seconds > 0 else 0
+    print(f"{name:27} depth {depth}: {count:12d}  {seconds:8.2f}s  {nps:10d} leaves/s")
+
+def run_depths(name, state, depths, bitboard):
+    ok = True
+    for depth in depths:
+        count, seconds = timed_perft(state, depth)
+        report(name, depth, count, seconds)
+        if bitboard:
+            bb_count, bb_seconds = timed_perft(state, depth, bitboard=True)
+            report(name + ' (bitboard)', depth, bb_count, bb_seconds)
+            if bb_count != count:
+                print(f"MISMATCH at depth {depth}: {count} != {bb_count}")
+                ok = False
+    return ok
+
+def run_divide(state, depth, bitboard):
+    counts = engine.perft(engine.create_engine_from_state(state), depth, divide=True)
+    bb_counts = {}
+    if bitboard:
+        bb_counts = engine.perft_bitboard(engine.create_bitboard_from_state(state), depth,
+                                          divide=True)
+    ok = True
+    for move in sorted(set(counts) | set(bb_counts)):
+        line = f"{move:8} {counts.get(move, '-')}"
+        if bitboard:
+            line += f"  {bb_counts.get(move, '-')}"
+            if counts.get(move) != bb_counts.get(move):
+                line += "  MISMATCH"
+                ok = False
+        print(line)
+    print(f"moves {len(counts)}, total {sum(counts.values())}")
+    return ok
+
+def run_check(positions, max_depth):
+    """Compares every stored reference count up to max_depth (all if None)."""
+    ok = True
+    for name, counts in load_reference().items():
+        for depth, expected in enumerate(counts, start=1):
+            if max_depth is not None and depth > max_depth:
+                break
+            count, seconds = timed_perft(positions[name], depth)
+            status = "ok" if count == expected else f"FAIL (expected {expected})"
+            print(f"{name:16} depth {depth}: {count:12d}  {seconds:8.2f}s  {status}")
+            ok = ok and count == expected
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generation check for engine.py.")
+    parser.add_argument('position', nargs='?', default='start',
+                        help="position name from bench_positions.json (default: start)")
+    parser.add_argument('depth', nargs='?', type=int,
+                        help=f"deepest depth to count (default {DEFAULT_DEPTH})")
+    parser.add_argument('--divide', action='store_true',
+                        help="counts per root move at 'depth'")
+    parser.add_argument('--bitboard', action='store_true',
+                        help="cross-check against BitboardEngine")
+    parser.add_argument('--check', nargs='?', type=int, const=0, metavar='DEPTH',
+                        help="compare with perft_reference.json (up to DEPTH if given)")
+    args = parser.parse_args(argv)
+
+    if (args.depth is not None and args.depth < 0) or (args.check is not None and args.check < 0):
+        parser.error("depths must be at least 0")
+
+    positions = load_positions()
+    if args.check is not None:
+        ok = run_check(positions, args.check or None)
+    elif args.position not in positions:
+        parser.error(f"unknown position {args.position!r}; known: {', '.join(positions)}")
+    else:
+        depth = DEFAULT_DEPTH if args.depth is None else args.depth
+        if args.divide:
+            ok = run_divide(positions[args.position], depth, args.bitboard)
+        else:
+            ok = run_depths(args.position, positions[args.position],
+                            range(1, depth + 1), args.bitboard)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
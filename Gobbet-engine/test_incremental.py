@@ -0,0 +1,88 @@
+"""
+The incremental state GobbletEngine keeps up to date in make/unmake_move
+(tops, line counts, full/open lines, histograms, supply counts, symmetric
+Zobrist keys) must always equal what a freshly built engine computes, and
+unmake_move must restore a position exactly. Checked over random games.
+
+    python -m pytest test_incremental.py
+"""
+import copy
+import random
+
+import engine
+
+GAMES = 150
+MAX_PLIES = 60
+UNMAKE_SAMPLE = 6        # moves made and unmade per position
+START = [0] * 16 + [3] * 8 + [1]
+
+
+def snapshot(position):
+    """Everything make/unmake_move touch, as comparable plain values."""
+    return {
+        'board': copy.deepcopy(position.board),
+        'supply1': copy.deepcopy(position.supply1),
+        'supply2': copy.deepcopy(position.supply2),
+        'current_player': position.current_player,
+        'supply_counts': copy.deepcopy(position.supply_counts),
+        'sym_keys': list(position.sym_keys),
+        'zobrist_key': position.zobrist_key,
+        'top_owner': list(position.top_owner),
+        'top_size': list(position.top_size),
+        'size_hist': list(position.size_hist),
+        'top_hist': copy.deepcopy(position.top_hist),
+        'line_counts': copy.deepcopy(position.line_counts),
+        'full_lines': list(position.full_lines),
+        'open_lines': list(position.open_lines),
+        'top_size_sum': list(position.top_size_sum),
+    }
+
+def rebuilt(position, current_player=None):
+    """A fresh engine of the same position, built from its board and supplies."""
+    return engine.GobbletEngine(copy.deepcopy(position.board), copy.deepcopy(position.supply1),
+                                copy.deepcopy(position.supply2),
+                                current_player or position.current_player)
+
+def check_against_fresh(position):
+    fresh = rebuilt(position)
+    assert snapshot(position) == snapshot(fresh)
+    for symmetry in range(len(engine.SYMMETRIES)):
+        assert position.sym_keys[symmetry] == engine.compute_zobrist(position, symmetry)
+    assert position.winner() == engine.check_winner(position.board)
+    for player in (1, 2):
+        moves = rebuilt(position, player).generate_moves()
+        assert position.count_moves(player) == len(moves)
+        assert position.has_any_move(player) == bool(moves)
+
+def random_games():
+    rng = random.Random(20240501)
+    for _ in range(GAMES):
+        position = engine.create_engine_from_array(START)
+        yield rng, position
+
+
+def test_incremental_state_matches_fresh_engine():
+    for rng, position in random_games():
+        check_against_fresh(position)
+        for _ in range(MAX_PLIES):
+            moves = position.generate_moves()
+            if not moves or position.winner() is not None:
+                break
+            position.make_move(rng.choice(moves))
+            check_against_fresh(position)
+
+def test_unmake_restores_exactly():
+    for rng, position in random_games():
+        for _ in range(MAX_PLIES):
+            moves = position.generate_moves()
+            if not moves or position.winner() is not None:
+                break
+            before = snapshot(position)
+            for move in rng.sample(moves, min(UNMAKE_SAMPLE, len(moves))):
+                undo = position.make_move(move)
+                position.unmake_move(undo)
+                assert snapshot(position) == before
+            undo = position.make_null_move()
+            position.unmake_null_move(undo)
+            assert snapshot(position) == before
+            position.make_move(rng.choice(moves))
@@ -0,0 +1,71 @@
+"""
+Root splitting must cover every root move (up to symmetry) between the
+shards, also once a search has filled the table, killers and history that
+decide the root's move order.
+
+    python -m pytest test_root_shard.py
+"""
+import engine
+
+START = [0] * 16 + [3] * 8 + [1]
+# A position reached after a few moves, with less symmetry than the start
+MIDGAME = [0, 27, 0, 0, 0, 0, 54, 0, 0, 0, 0, 9, 0, 0, 0, 0, 3, 3, 2, 2, 3, 3, 3, 2, 2]
+
+
+def warm_context():
+    """A context that has searched the start position and a reply."""
+    context = engine.SearchContext(adaptive_time=False)
+    position = engine.create_engine_from_array(START)
+    move, _ = engine.iterative_deepening(position, 1e9, context, max_depth=4)
+    position.make_move(move)
+    engine.iterative_deepening(position, 1e9, context, max_depth=3)
+    return context
+
+def searched_classes(wire, shard, shards):
+    """Canonical keys of the children the root of shard 'shard' searched."""
+    context = warm_context()
+    position = engine.create_engine_from_array(wire)
+    seen = set()
+    search = engine.alpha_beta
+
+    def recording_alpha_beta(*args, **kwargs):
+        ply = args[6] if len(args) > 6 else kwargs.get('ply', 0)
+        if ply == 1:
+            seen.add(args[0].canonical()[0])
+        return search(*args, **kwargs)
+
+    context.root_moves = engine.root_shard(position, shard, shards)
+    engine.alpha_beta = recording_alpha_beta
+    try:
+        engine.iterative_deepening(position, 1e9, context, max_depth=2)
+    finally:
+        engine.alpha_beta = search
+        context.root_moves = None
+    return seen
+
+def all_classes(wire):
+    position = engine.create_engine_from_array(wire)
+    classes = set()
+    for move in position.generate_moves():
+        undo = position.make_move(move)
+        classes.add(position.canonical()[0])
+        position.unmake_move(undo)
+    return classes
+
+def check_cover(wire, shards):
+    union = set()
+    for shard in range(shards):
+        union |= searched_classes(wire, shard, shards)
+    assert union == all_classes(wire)
+
+def test_start_position_two_shards():
+    check_cover(START, 2)
+
+def test_start_position_three_shards():
+    check_cover(START, 3)
+
+def test_start_position_four_shards():
+    check_cover(START, 4)
+
+def test_midgame_four_shards():
+    check_cover(MIDGAME, 4)
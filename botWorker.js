@@ -1,55 +1,179 @@
 // botWorker.js
-importScripts("https://cdn.jsdelivr.net/pyodide/v0.23.1/full/pyodide.js");
 
-let pyodideReady = false;
+// Pyodide comes from the CDN. A deployment that ships its own copy can have
+// it tried first by starting the worker as "botWorker.js?pyodide=<path>/",
+// which saves the CDN round trips on a cold start.
+const PYODIDE_CDN = "https://cdn.jsdelivr.net/pyodide/v0.23.1/full/";
+const PYODIDE_URLS = [new URLSearchParams(self.location.search).get("pyodide"), PYODIDE_CDN]
+  .filter(Boolean);
+// Engines preloaded at startup, each imported as its own Python module so
+// switching between them re-runs nothing and they share no globals.
+const ENGINE_FILES = ["engine.py", "engineowen.py"];
+const ENGINE_DIR = "/engines";
+
 let pyodide = null;
-let currentEngineFile = null;  // Keep track of the currently loaded engine file
+let runSearch = null;  // Python run_search below, called directly (no code strings)
+
+// Compiled once at startup. The position arrives in engine.py's compact wire
+// format (an Int32Array, see WIRE_LENGTH there); engines without
+// create_engine_from_array get it converted to the usual state dict.
+// Engines without get_move_shard can't split the root: shard 0 searches it
+// all alone. report(depth, score, move, nodes, nps) is called after each
+// completed depth and should_stop() polled during the search, for engines
+// whose get_move takes on_depth / should_stop; with want_stats such engines
+// also return their search statistics (engine.py's SearchStats). Sharded
+// searches also return their best [depth, score, move] of every completed
+// depth, so the page can compare shards at a depth they all reached.
+// Returns [move as [from_sq or -1, to_sq, size] or None, score, depth, stats or None,
+//          depths or None].
+const RUN_SEARCH = `
+import inspect
+from pyodide.ffi import to_js
+
+def run_search(engine_file, wire, time_limit, shard, shards, report, should_stop,
+               want_stats):
+    module = ENGINES[engine_file]
+    codec = ENGINES['engine.py']
+    wire = list(wire.to_py())
+    if hasattr(module, 'create_engine_from_array'):
+        engine = module.create_engine_from_array(wire)
+    else:
+        engine = module.create_engine_from_state(codec.create_bitboard_from_array(wire).to_state())
+    options = {}
+    parameters = inspect.signature(module.get_move).parameters
+    if 'on_depth' in parameters:
+        def on_depth(depth, score, move, nodes, nps):
+            report(depth, score, to_js(codec.move_to_array(move)), nodes, nps)
+        options = {'on_depth': on_depth, 'should_stop': should_stop}
+    want_stats = want_stats and 'return_stats' in parameters
+    if want_stats:
+        options['return_stats'] = True
+    if shards > 1 and hasattr(module, 'get_move_shard'):
+        result = module.get_move_shard(engine, time_limit, shard, shards, **options)
+    elif shard == 0:
+        result = module.get_move(engine, time_limit, **options)
+        result = dict(zip(('move', 'stats'), result)) if want_stats else {'move': result}
+    else:
+        result = {'move': None}
+    move = result['move']
+    return [codec.move_to_array(move) if move else None,
+            result.get('score'), result.get('depth'), result.get('stats'), result.get('depths')]
+`;
+
+function importPyodideScript() {
+  for (const url of PYODIDE_URLS) {
+    try {
+      importScripts(url + "pyodide.js");
+      return url;
+    } catch (err) {
+      console.warn("Pyodide not available from " + url, err);
+    }
+  }
+  throw new Error("Could not load Pyodide");
+}
+
+function fetchEngine(engineFile) {
+  return fetch("Gobbet-engine/" + engineFile).then(response => response.text());
+}
+
+// Write an engine's source into Pyodide's file system and import it as a
+// module; the module lands in the Python dict ENGINES[engineFile].
+async function importEngine(engineFile, code) {
+  pyodide.FS.writeFile(ENGINE_DIR + "/" + engineFile, code);
+  await pyodide.runPythonAsync(`
+import importlib
+ENGINES[${JSON.stringify(engineFile)}] = importlib.import_module(${JSON.stringify(engineFile.replace(/\.py$/, ""))})
+`);
+}
 
 async function initPyodide() {
-  pyodide = await loadPyodide();
-  // Initially load the default engine code from engine.py
-  const engineCode = await (await fetch("Gobbet-engine/engine.py")).text();
-  await pyodide.runPythonAsync(engineCode);
-  currentEngineFile = "engine.py";
-  pyodideReady = true;
-  console.log("Pyodide and initial engine loaded in worker.");
+  const indexURL = importPyodideScript();
+  pyodide = await loadPyodide({ indexURL: indexURL });
+  pyodide.FS.mkdir(ENGINE_DIR);
+  pyodide.runPython(`
+import sys
+sys.path.insert(0, ${JSON.stringify(ENGINE_DIR)})
+ENGINES = {}
+`);
+  const codes = await Promise.all(ENGINE_FILES.map(fetchEngine));
+  const loaded = [];
+  for (let i = 0; i < ENGINE_FILES.length; i++) {
+    try {
+      await importEngine(ENGINE_FILES[i], codes[i]);
+      loaded.push(ENGINE_FILES[i]);
+    } catch (err) {
+      // Not fatal: it is retried when a move is asked of that engine
+      console.error("Failed to preload " + ENGINE_FILES[i], err);
+    }
+  }
+  pyodide.runPython(RUN_SEARCH);
+  runSearch = pyodide.globals.get("run_search");
+  console.log("Pyodide and engines " + loaded.join(", ") + " loaded in worker.");
+  self.postMessage({ ready: true, engines: loaded });
 }
-initPyodide();
+const pyodideReady = initPyodide();
+pyodideReady.catch(err => self.postMessage({ failed: true, error: "Failed to start engine: " + err.toString() }));
 
 self.onmessage = async function(e) {
-  const { state, timeLimit, engineFile } = e.data;
-  
-  // Wait until Pyodide is ready
-  while (!pyodideReady) {
-    await new Promise(resolve => setTimeout(resolve, 100));
+  const { wire, timeLimit, newGame, stats } = e.data;
+  const engineFile = e.data.engineFile || ENGINE_FILES[0];
+  // Pool mode: this worker searches root shard 'shard' of 'shards' (see
+  // get_move_shard in engine.py). Without pool fields it is the only worker.
+  const shard = e.data.shard || 0;
+  const shards = e.data.shards || 1;
+  // Replies carry the page's turn number so it can drop late ones.
+  const turn = e.data.turn;
+
+  // A worker that failed to start still answers, so no turn waits on it
+  try {
+    await pyodideReady;
+  } catch (err) {
+    if (!newGame) {
+      self.postMessage({ error: "Engine not started: " + err.toString(), shard: shard, turn: turn });
+    }
+    return;
   }
-  
-  // If the requested engine file is different, fetch and run it.
-  if (engineFile && engineFile !== currentEngineFile) {
+
+  // A new game drops the engines' game-scoped search state (their
+  // transposition tables). Engines without one simply ignore this.
+  if (newGame) {
+    pyodide.runPython(`
+for module in ENGINES.values():
+    if hasattr(module, 'new_game'):
+        module.new_game()
+`);
+    return;
+  }
+
+  // Engine files that weren't preloaded are imported on first use.
+  if (!pyodide.runPython(`${JSON.stringify(engineFile)} in ENGINES`)) {
     try {
-      const newEngineCode = await (await fetch("Gobbet-engine/" + engineFile)).text();
-      await pyodide.runPythonAsync(newEngineCode);
-      currentEngineFile = engineFile;
+      await importEngine(engineFile, await fetchEngine(engineFile));
       console.log("Loaded new engine file:", engineFile);
     } catch(err) {
-      self.postMessage({ error: "Failed to load engine file: " + err.toString() });
+      self.postMessage({ error: "Failed to load engine file: " + err.toString(), shard: shard, turn: turn });
       return;
     }
   }
-  
-  // Construct the Python command to run the engine logic
-  const command = `
-import json
-state = json.loads('${JSON.stringify(state)}')
-engine = create_engine_from_state(state)
-move = get_move(engine, ${timeLimit})
-json.dumps(move)
-`;
+
+  // Progress goes to the page after every completed depth. A stop flag
+  // (an Int32Array over a SharedArrayBuffer, only available when the page is
+  // cross-origin isolated) lets the page end the search early; without one
+  // the search always runs its full time.
+  const report = (depth, score, move, nodes, nps) => {
+    self.postMessage({ progress: { depth: depth, score: score, move: move, nodes: nodes, nps: nps },
+                       shard: shard, turn: turn });
+  };
+  const stopFlag = e.data.stop ? new Int32Array(e.data.stop) : null;
+  const shouldStop = stopFlag ? () => Atomics.load(stopFlag, 0) !== 0 : null;
+
   try {
-    let resultJson = await pyodide.runPythonAsync(command);
-    const result = JSON.parse(resultJson);
-    self.postMessage({ move: result });
+    const result = runSearch(engineFile, wire, timeLimit, shard, shards, report, shouldStop, !!stats);
+    const [move, score, depth, searchStats, depths] = result.toJs({ dict_converter: Object.fromEntries });
+    result.destroy();
+    self.postMessage({ move: move || null, score: score, depth: depth, stats: searchStats || null,
+                       depths: depths || null, shard: shard, turn: turn });
   } catch (error) {
-    self.postMessage({ error: error.toString() });
+    self.postMessage({ error: error.toString(), shard: shard, turn: turn });
   }
 };